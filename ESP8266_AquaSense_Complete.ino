@@ -21,6 +21,10 @@ DHT dht(DHT_PIN, DHT_TYPE);
 WiFiClient wifiClient;
 HTTPClient http;
 
+// Lets the server recognise retried posts of the same reading
+uint32_t bootId = 0;
+uint32_t readingSeq = 0;
+
 void setup() {
   Serial.begin(115200);
   Serial.println();
@@ -31,6 +35,8 @@ void setup() {
   pinMode(ECHO_PIN, INPUT);
   pinMode(LED_BUILTIN, OUTPUT);
   
+  bootId = ESP.getChipId() ^ micros() ^ RANDOM_REG32;
+  
   connectToWiFi();
 }
 
@@ -135,6 +141,9 @@ void sendDataToServer() {
   doc["soil_moisture"] = soilMoisture;
   doc["distance"] = distance;
   doc["soil_type"] = "Sandy"; // You can change this or make it configurable
+  doc["device_id"] = WiFi.macAddress();
+  doc["boot"] = bootId;
+  doc["seq"] = ++readingSeq;
   
   String jsonString;
   serializeJson(doc, jsonString);
@@ -145,6 +154,9 @@ void sendDataToServer() {
   // Send HTTP POST request
   http.begin(wifiClient, serverURL);
   http.addHeader("Content-Type", "application/json");
+  http.addHeader("X-Device-Id", WiFi.macAddress());
+  // A clustered server answers 307 with the node that owns this device
+  http.setFollowRedirects(HTTPC_FORCE_FOLLOW_REDIRECTS);
   
   int httpResponseCode = http.POST(jsonString);
   
@@ -0,0 +1,173 @@
+"""
+Per-device and global admission control for sensor ingest.
+
+Every reading must take a token from its device's bucket and from the global
+bucket before its body is even parsed, so a device stuck in a loop only
+exhausts its own allowance. Readings without an X-Device-Id header only take
+the global token up front and are charged to their device once the body
+names it. When the global bucket runs low the server is overloaded and sheds
+by priority: exact duplicates are always dropped by the idempotency check,
+near-identical readings are dropped next, and only when the global bucket is
+empty is everything shed. Readings shed after admission give their global
+token back. Shed traffic is counted per reason.
+
+MQTT readings are not shed at all: their ingest worker waits for a global
+token (take_global) and leaves messages unacked meanwhile, so the broker's
+in-flight window throttles delivery instead.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+FIELDS = ("temperature", "humidity", "moisture", "distance")
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now):
+        """Consume one token; False if none are left"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def fill(self, now):
+        """Fraction of the bucket currently available"""
+        self._refill(now)
+        return self.tokens / self.burst
+
+    def retry_after(self):
+        """Seconds until the next token is available"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class AdmissionController:
+    """Token-bucket rate limiting and priority load shedding"""
+
+    def __init__(self, device_rate=0.5, device_burst=5, global_rate=200.0, global_burst=400,
+                 overload_fill=0.25, tolerance=0.5, max_devices=10000):
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.overload_fill = overload_fill
+        self.tolerance = tolerance
+        self.max_devices = max_devices
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.admitted = 0
+        self.shed = Counter()
+        # Both bounded, so spoofed device ids can't grow memory without limit
+        self._buckets = OrderedDict()
+        self._last_values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, table, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        if len(table) > self.max_devices:
+            table.popitem(last=False)
+
+    def _device_bucket(self, device_id, now):
+        bucket = self._buckets.get(device_id)
+        if bucket is None:
+            bucket = TokenBucket(self.device_rate, self.device_burst, now)
+        self._remember(self._buckets, device_id, bucket)
+        return bucket
+
+    def admit(self, device_id, now=None):
+        """(admitted, reason, retry_after) for a reading about to be parsed.
+        With device_id None only the global token is taken; the device is
+        charged by admit_device() once its id is known from the body."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = None
+            if device_id is not None:
+                bucket = self._device_bucket(device_id, now)
+                if not bucket.take(now):
+                    self.shed["device_rate_limited"] += 1
+                    return False, "device_rate_limited", bucket.retry_after()
+            if not self.global_bucket.take(now):
+                # Not the device's fault: give its token back
+                if bucket is not None:
+                    bucket.tokens += 1
+                self.shed["global_overload"] += 1
+                return False, "global_overload", self.global_bucket.retry_after()
+            self.admitted += 1
+            return True, None, 0.0
+
+    def admit_device(self, device_id, now=None):
+        """Per-device check for a reading admitted with admit(None); a rejected
+        reading gets its global token back"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._device_bucket(device_id, now)
+            if bucket.take(now):
+                return True, None, 0.0
+            self._refund_global()
+            self.admitted -= 1
+            self.shed["device_rate_limited"] += 1
+            return False, "device_rate_limited", bucket.retry_after()
+
+    def take_global(self, now=None):
+        """Take a global token for a reading that waits rather than being shed;
+        returns 0.0 if taken, otherwise the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.global_bucket.take(now):
+                return 0.0
+            return self.global_bucket.retry_after()
+
+    def _refund_global(self):
+        self.global_bucket.tokens = min(self.global_bucket.burst, self.global_bucket.tokens + 1)
+
+    def refund_global(self):
+        """Return the global token of an admitted reading that won't be processed here"""
+        with self._lock:
+            self._refund_global()
+
+    def overloaded(self, now=None):
+        """True while the global bucket is below the overload watermark"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self.global_bucket.fill(now) < self.overload_fill
+
+    def shed_near_duplicate(self, device_id, values, now=None):
+        """True if, under overload, values barely differ from the device's last reading"""
+        values = tuple(values[field] for field in FIELDS)
+        overloaded = self.overloaded(now)
+        with self._lock:
+            last = self._last_values.get(device_id)
+            if overloaded and last is not None and all(
+                    abs(a - b) <= self.tolerance for a, b in zip(values, last)):
+                # Hand its admission back so the budget goes to new information
+                self._refund_global()
+                self.admitted -= 1
+                self.shed["near_duplicate"] += 1
+                return True
+            self._remember(self._last_values, device_id, values)
+            return False
+
+    def count_duplicate(self):
+        with self._lock:
+            self.shed["duplicate"] += 1
+
+    def stats(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "shed_total": sum(self.shed.values()),
+                "global_fill": round(self.global_bucket.fill(now), 3),
+                "overloaded": self.global_bucket.fill(now) < self.overload_fill,
+                "tracked_devices": len(self._buckets)
+            }
@@ -0,0 +1,285 @@
+"""
+Streaming alert rules evaluated on every stored reading.
+
+A rule is a one-line condition on a reading field, optionally held for a
+duration, scoped to one device and given a cooldown between alerts:
+
+    moisture < 20 for 30m
+    water_table > 50
+    temperature >= 38 for 10m
+
+Rules are parsed once into predicate closures and indexed by device and
+field, so a reading only runs the rules on its own device (plus fleet-wide
+ones) for the fields it carries. Each (rule, device) pair keeps how long the
+condition has held; an alert fires once when it has held for the rule's
+duration, stays quiet while it keeps holding, and sends a "resolved" event
+when the condition clears; a cooldown keeps a flapping sensor from
+re-alerting right away. Notifiers are pluggable: a JSON-lines file for
+local testing or a webhook.
+
+alert_rules.json is the configured starting set and is never written.
+Rules added or removed at runtime are saved to a separate state file (one per
+node, like the snapshot), which replaces the configured set on the next boot.
+"""
+import json
+import operator
+import os
+import queue
+import re
+import tempfile
+import threading
+import urllib.request
+from datetime import datetime
+
+from timeseries_store import DURATION_UNITS, FIELDS, parse_duration
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Names operators use for the stored fields
+FIELD_ALIASES = {
+    "temp": "temperature",
+    "soil_moisture": "moisture",
+    "water_table": "distance",
+    "water_table_depth": "distance",
+}
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert_rules.json")
+
+RULE_PATTERN = re.compile(
+    r"^\s*(?P<field>[a-z_]+)\s*(?P<op><=|>=|==|!=|<|>)\s*(?P<threshold>-?\d+(?:\.\d+)?)"
+    r"(?:\s+for\s+(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>[%s]))?\s*$" % "".join(DURATION_UNITS))
+
+class RuleError(ValueError):
+    pass
+
+class Rule:
+    """One compiled alert condition"""
+
+    def __init__(self, name, when, device="*", cooldown=0):
+        for label, value in (("name", name), ("when", when), ("device", device or "*")):
+            if not isinstance(value, str) or not value:
+                raise RuleError(f"{label} must be a non-empty string")
+        match = RULE_PATTERN.match(when.lower())
+        if match is None:
+            raise RuleError(f"Can't parse rule {when!r}; expected e.g. 'moisture < 20 for 30m'")
+        field = FIELD_ALIASES.get(match["field"], match["field"])
+        if field not in FIELDS:
+            raise RuleError(f"Unknown field {match['field']!r} in {when!r}")
+        compare = OPERATORS[match["op"]]
+        threshold = float(match["threshold"])
+
+        self.name = name
+        self.when = when
+        self.device = device or "*"
+        self.field = field
+        self.threshold = threshold
+        self.hold_seconds = parse_duration(match["amount"] + match["unit"]) if match["amount"] else 0
+        try:
+            self.cooldown = parse_duration(cooldown)
+        except ValueError:
+            raise RuleError(f"Bad duration {cooldown!r}") from None
+        self.predicate = lambda value: compare(value, threshold)
+
+    def to_dict(self):
+        return {"name": self.name, "when": self.when, "device": self.device, "cooldown": self.cooldown}
+
+    @classmethod
+    def from_dict(cls, spec):
+        if not isinstance(spec, dict):
+            raise RuleError("A rule must be a JSON object")
+        try:
+            return cls(spec["name"], spec["when"], spec.get("device", "*"), spec.get("cooldown", 0))
+        except KeyError as e:
+            raise RuleError(f"{e.args[0]} is required") from None
+
+class FileNotifier:
+    """Append alert events to a JSON-lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, event):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+class WebhookNotifier:
+    """POST alert events as JSON from a background thread so ingest never waits"""
+
+    def __init__(self, url, timeout=5.0, max_pending=1000):
+        self.url = url
+        self.timeout = timeout
+        self.failed = 0
+        self._queue = queue.Queue(max_pending)
+        threading.Thread(target=self._run, name="alert-webhook", daemon=True).start()
+
+    def notify(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.failed += 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            req = urllib.request.Request(self.url, data=json.dumps(event).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(req, timeout=self.timeout).close()
+            except OSError as e:
+                self.failed += 1
+                print(f"❌ Alert webhook {self.url} failed: {e}")
+
+class AlertEngine:
+    """Rules indexed by device and field, with per-device hold/firing state"""
+
+    def __init__(self, notifiers=(), max_events=100, state_path=None):
+        self.notifiers = list(notifiers)
+        # Where save() persists runtime rule changes; None keeps them in memory only
+        self.state_path = state_path
+        self.max_events = max_events
+        self.rules = {}
+        self.events = []
+        # device ("*" for every device) -> field -> [Rule]
+        self._index = {}
+        # (rule name, device) -> [condition held since, firing]
+        self._state = {}
+        # (rule name, device) -> epoch of the last firing event, for cooldowns
+        self._last_fired = {}
+        self._lock = threading.Lock()
+
+    def _reindex(self):
+        index = {}
+        for rule in self.rules.values():
+            index.setdefault(rule.device, {}).setdefault(rule.field, []).append(rule)
+        self._index = index
+
+    def add_rule(self, rule):
+        """Add or replace a rule by name; its hold/firing state starts over"""
+        with self._lock:
+            self.rules[rule.name] = rule
+            self._forget(rule.name)
+
+    def _forget(self, name):
+        self._state = {key: state for key, state in self._state.items() if key[0] != name}
+        self._last_fired = {key: ts for key, ts in self._last_fired.items() if key[0] != name}
+        self._reindex()
+
+    def remove_rule(self, name):
+        with self._lock:
+            removed = self.rules.pop(name, None)
+            self._forget(name)
+            return removed is not None
+
+    def load(self, path):
+        """Add rules from a JSON list of {"name", "when", "device", "cooldown"} objects"""
+        with open(path, encoding="utf-8") as f:
+            for spec in json.load(f):
+                self.add_rule(Rule.from_dict(spec))
+
+    def save(self):
+        """Write the current rules to state_path, atomically"""
+        if self.state_path is None:
+            return
+        with self._lock:
+            specs = [rule.to_dict() for rule in self.rules.values()]
+            # A unique temp file, so concurrent savers never rename each other's
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.state_path) + ".",
+                                       dir=os.path.dirname(os.path.abspath(self.state_path)))
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(specs, f, indent=2)
+                os.replace(tmp, self.state_path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+    def evaluate(self, device_id, ts, values):
+        """Run the rules matching this reading; returns the events it triggered"""
+        events = []
+        with self._lock:
+            for scope in (device_id, "*"):
+                by_field = self._index.get(scope)
+                if not by_field:
+                    continue
+                for field, value in values.items():
+                    for rule in by_field.get(field, ()):
+                        event = self._step(rule, device_id, ts, value)
+                        if event is not None:
+                            events.append(event)
+            if events:
+                self.events.extend(events)
+                del self.events[:-self.max_events]
+        for event in events:
+            print(f"🚨 Alert {event['rule']} {event['state']} for {device_id}: {event['field']}={event['value']}")
+            for notifier in self.notifiers:
+                try:
+                    notifier.notify(event)
+                except Exception as e:
+                    print(f"❌ Alert notifier failed: {e}")
+        return events
+
+    def _step(self, rule, device_id, ts, value):
+        key = (rule.name, device_id)
+        state = self._state.get(key)
+        if not rule.predicate(value):
+            if state is None:
+                return None
+            del self._state[key]
+            return self._event(rule, device_id, ts, value, "resolved") if state[1] else None
+        if state is None:
+            state = self._state[key] = [ts, False]
+        if not state[1] and ts - state[0] >= rule.hold_seconds:
+            last_fired = self._last_fired.get(key)
+            if last_fired is not None and ts - last_fired < rule.cooldown:
+                return None
+            state[1] = True
+            self._last_fired[key] = ts
+            return self._event(rule, device_id, ts, value, "firing", since=state[0])
+        return None
+
+    def _event(self, rule, device_id, ts, value, state, since=None):
+        event = {
+            "rule": rule.name,
+            "when": rule.when,
+            "state": state,
+            "device_id": device_id,
+            "field": rule.field,
+            "value": value,
+            "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+            "epoch": ts
+        }
+        if since is not None:
+            event["since"] = since
+        return event
+
+    def firing(self):
+        """(rule name, device) pairs currently firing"""
+        with self._lock:
+            return [{"rule": name, "device_id": device_id, "since": since}
+                    for (name, device_id), (since, firing) in self._state.items() if firing]
+
+def alert_engine_from_env(state_path=None):
+    """AlertEngine configured by AQUASENSE_ALERT_RULES / _ALERT_LOG / _ALERT_WEBHOOK,
+    with the rules saved at state_path instead if that file exists"""
+    environ = os.environ
+    notifiers = []
+    if environ.get("AQUASENSE_ALERT_LOG"):
+        notifiers.append(FileNotifier(environ["AQUASENSE_ALERT_LOG"]))
+    if environ.get("AQUASENSE_ALERT_WEBHOOK"):
+        notifiers.append(WebhookNotifier(environ["AQUASENSE_ALERT_WEBHOOK"]))
+    engine = AlertEngine(notifiers, state_path=state_path)
+    path = environ.get("AQUASENSE_ALERT_RULES", DEFAULT_RULES_PATH)
+    if state_path is not None and os.path.exists(state_path):
+        path = state_path
+    if os.path.exists(path):
+        engine.load(path)
+    return engine
@@ -0,0 +1,195 @@
+"""
+Rule-based crop and water analysis shared by the HTTP server and background jobs.
+
+Kept free of Flask so it can be imported cheaply by worker processes. When a
+trained RandomForest has been exported (see train_model.py) its prediction
+is added alongside the rule-based one.
+"""
+from collections import Counter
+
+import model_store
+
+# Bump whenever the thresholds in predict_crop/analyze_water change so that
+# stored records can be detected as stale and re-analyzed.
+RULES_VERSION = "rules-1"
+
+# Soil moisture (%) below which analyze_water() asks for irrigation
+MOISTURE_LOW = 20
+MOISTURE_BELOW_OPTIMAL = 40
+
+def safe_float(value, default=0.0):
+    """Safely convert value to float"""
+    try:
+        if value is None:
+            return default
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def predict_crop(temp, humidity, moisture, soil_type, distance=None):
+    """Enhanced crop prediction with water table analysis"""
+    try:
+        crop_recommendations = []
+        confidence_factors = []
+        
+        # Temperature-based recommendations
+        if 15 <= temp <= 25:
+            crop_recommendations.extend(["Wheat", "Potato", "Barley"])
+            confidence_factors.append("optimal_temp")
+        elif 20 <= temp <= 30:
+            if humidity > 60:
+                crop_recommendations.extend(["Rice", "Sugarcane"])
+            else:
+                crop_recommendations.extend(["Maize", "Cotton"])
+            confidence_factors.append("good_temp")
+        elif temp > 30:
+            crop_recommendations.extend(["Bajra", "Sorghum", "Groundnut"])
+            confidence_factors.append("hot_climate")
+        
+        if moisture < 30:
+            crop_recommendations.extend(["Bajra", "Groundnut", "Sorghum"])
+            confidence_factors.append("drought_tolerant")
+        elif 30 <= moisture <= 70:
+            crop_recommendations.extend(["Wheat", "Maize", "Cotton"])
+            confidence_factors.append("moderate_water")
+        else:
+            crop_recommendations.extend(["Rice", "Sugarcane"])
+            confidence_factors.append("high_water")
+        
+        # Distance-based water table analysis
+        if distance is not None:
+            if distance < 15:  # Shallow water table
+                crop_recommendations.extend(["Rice", "Sugarcane", "Jute"])
+                confidence_factors.append("shallow_water_table")
+            elif distance < 30:  # Moderate water access
+                crop_recommendations.extend(["Wheat", "Maize", "Cotton"])
+                confidence_factors.append("moderate_water_access")
+            else:  # Deep water table - drought resistant crops
+                crop_recommendations.extend(["Bajra", "Groundnut", "Millets"])
+                confidence_factors.append("deep_water_table")
+        
+        # Soil type adjustments
+        if soil_type.lower() in ['clay', 'loamy']:
+            crop_recommendations.extend(["Rice", "Wheat", "Cotton"])
+        elif soil_type.lower() == 'sandy':
+            crop_recommendations.extend(["Groundnut", "Bajra", "Watermelon"])
+        
+        # Calculate most suitable crop
+        crop_counts = Counter(crop_recommendations)
+        
+        if crop_counts:
+            predicted_crop = crop_counts.most_common(1)[0][0]
+            # Confidence based on number of recommendations and factors
+            confidence_score = min(95, crop_counts.most_common(1)[0][1] * 12 + len(confidence_factors) * 8 + 40)
+            confidence = f"{confidence_score}%"
+        else:
+            predicted_crop = "Mixed Farming"
+            confidence = "70%"
+            
+        return predicted_crop, confidence
+        
+    except Exception as e:
+        print(f"❌ Crop prediction error: {e}")
+        return "Mixed Farming", "60%"
+
+def analyze_water(moisture, soil_type, humidity, distance=None):
+    """Enhanced water analysis with distance-based water table detection"""
+    try:
+        # Base water analysis from moisture
+        if moisture < MOISTURE_LOW:
+            water_status = "Low"
+            irrigation = "Immediate irrigation required"
+        elif moisture < MOISTURE_BELOW_OPTIMAL:
+            water_status = "Below Optimal"
+            irrigation = "Light irrigation recommended"
+        elif moisture < 70:
+            water_status = "Optimal"
+            irrigation = "No irrigation needed"
+        else:
+            water_status = "High"
+            irrigation = "Avoid watering - risk of waterlogging"
+        
+        # Enhanced analysis with distance (water table depth)
+        if distance is not None:
+            if distance < 10:  # Very close to water source/high water table
+                water_table = f"Shallow ({distance:.1f}cm) - High water table"
+                if moisture > 60:
+                    irrigation = "No irrigation - natural water available"
+                    water_status = "Naturally High"
+            elif distance < 25:  # Moderate distance
+                water_table = f"Moderate depth ({distance:.1f}cm) - Good water access"
+                if moisture < 30:
+                    irrigation = "Light irrigation sufficient - water table accessible"
+            elif distance < 50:  # Deeper water table
+                water_table = f"Deep ({distance:.1f}cm) - Limited natural water"
+                if moisture < 40:
+                    irrigation = "Regular irrigation needed - deep water table"
+            else:  # Very deep or no water detected
+                water_table = f"Very deep ({distance:.1f}cm) - Rely on irrigation"
+                irrigation = "Frequent irrigation required - no natural water source"
+        else:
+            water_table = "Unknown depth - sensor not available"
+        
+        return water_status, irrigation, water_table
+        
+    except Exception as e:
+        print(f"❌ Water analysis error: {e}")
+        return "Unknown", "Check manually", "Sensor error"
+
+def analysis_version():
+    """Version tag for the combined rule/model analysis"""
+    model_version = model_store.forest_version()
+    if model_version:
+        return f"{RULES_VERSION}+{model_version}"
+    return RULES_VERSION
+
+def predict_crop_model(rows, forest=None):
+    """Crops predicted by the exported forest for (temp, humidity, moisture, soil_type) rows
+
+    Rows with a soil type the model wasn't trained on get None, as does every
+    row when no model has been exported.
+    """
+    forest = forest if forest is not None else model_store.load_forest()
+    predictions = [None] * len(rows)
+    if forest is None:
+        return predictions
+    features = []
+    scored = []
+    for i, (temp, humidity, moisture, soil_type) in enumerate(rows):
+        soil_code = model_store.encode("soil", str(soil_type).strip().capitalize())
+        if soil_code is not None:
+            features.append((temp, humidity, moisture, soil_code))
+            scored.append(i)
+    if len(features) == 1:
+        predictions[scored[0]] = model_store.decode("crop", forest.predict_one(features[0]))
+    elif features:
+        for i, code in zip(scored, forest.predict(features)):
+            predictions[i] = model_store.decode("crop", code)
+    return predictions
+
+def analyze_reading(temp, humidity, moisture, soil_type, distance=None, use_model=True):
+    """Run crop and water analysis and return the stored analysis dict"""
+    crop, confidence = predict_crop(temp, humidity, moisture, soil_type, distance)
+    water_status, irrigation, water_table = analyze_water(moisture, soil_type, humidity, distance)
+    analysis = {
+        "predicted_crop": crop,
+        "confidence": confidence,
+        "water_status": water_status,
+        "irrigation_needed": irrigation,
+        "water_table_estimate": water_table,
+        "version": analysis_version()
+    }
+    if use_model:
+        model_crop = predict_crop_model([(temp, humidity, moisture, soil_type)])[0]
+        if model_crop is not None:
+            analysis["model_crop"] = model_crop
+    return analysis
+
+def analyze_batch(rows):
+    """analyze_reading() for many input tuples, with one batched model call"""
+    analyses = [analyze_reading(*row, use_model=False) for row in rows]
+    model_crops = predict_crop_model([row[:4] for row in rows])
+    for analysis, model_crop in zip(analyses, model_crops):
+        if model_crop is not None:
+            analysis["model_crop"] = model_crop
+    return analyses
@@ -1,131 +1,92 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, redirect, render_template
 from datetime import datetime
+import atexit
+import math
+import os
+import signal
+import sys
+import threading
+import time
 import traceback
+import urllib.parse
+
+from admission import AdmissionController
+from alert_rules import Rule, RuleError, alert_engine_from_env
+from archive import ColumnArchive, CompactionJob
+from analysis import safe_float, predict_crop, analyze_water, analyze_reading
+from reanalysis import ReanalysisJob
+from ingest_dedup import PENDING, SeenSet, idempotency_key
+from response_cache import ResponseCache
+from sharding import cluster_from_env, merge_logs, merge_schedules
+from snapshot import load_snapshot, save_snapshot
+from timeseries_store import TimeSeriesStore, finite_float, parse_duration
 
 app = Flask(__name__)
 
+# Cluster nodes started from one directory must not share state files, so
+# their default file names carry the node name
+NODE_SUFFIX = f"_{os.environ['AQUASENSE_NODE']}" if os.environ.get("AQUASENSE_NODE") else ""
+
 # Store sensor readings
 sensor_data_log = []
 
-def safe_float(value, default=0.0):
-    """Safely convert value to float"""
-    try:
-        if value is None:
-            return default
-        return float(value)
-    except (TypeError, ValueError):
-        return default
+# Readings older than AQUASENSE_ARCHIVE_AFTER are compacted into files here
+ARCHIVE_DIR = os.environ.get("AQUASENSE_ARCHIVE_DIR", f"archive{NODE_SUFFIX}")
 
-def predict_crop(temp, humidity, moisture, soil_type, distance=None):
-    """Enhanced crop prediction with water table analysis"""
-    try:
-        crop_recommendations = []
-        confidence_factors = []
-        
-        # Temperature-based recommendations
-        if 15 <= temp <= 25:
-            crop_recommendations.extend(["Wheat", "Potato", "Barley"])
-            confidence_factors.append("optimal_temp")
-        elif 20 <= temp <= 30:
-            if humidity > 60:
-                crop_recommendations.extend(["Rice", "Sugarcane"])
-            else:
-                crop_recommendations.extend(["Maize", "Cotton"])
-            confidence_factors.append("good_temp")
-        elif temp > 30:
-            crop_recommendations.extend(["Bajra", "Sorghum", "Groundnut"])
-            confidence_factors.append("hot_climate")
-        
-        if moisture < 30:
-            crop_recommendations.extend(["Bajra", "Groundnut", "Sorghum"])
-            confidence_factors.append("drought_tolerant")
-        elif 30 <= moisture <= 70:
-            crop_recommendations.extend(["Wheat", "Maize", "Cotton"])
-            confidence_factors.append("moderate_water")
-        else:
-            crop_recommendations.extend(["Rice", "Sugarcane"])
-            confidence_factors.append("high_water")
-        
-        # Distance-based water table analysis
-        if distance is not None:
-            if distance < 15:  # Shallow water table
-                crop_recommendations.extend(["Rice", "Sugarcane", "Jute"])
-                confidence_factors.append("shallow_water_table")
-            elif distance < 30:  # Moderate water access
-                crop_recommendations.extend(["Wheat", "Maize", "Cotton"])
-                confidence_factors.append("moderate_water_access")
-            else:  # Deep water table - drought resistant crops
-                crop_recommendations.extend(["Bajra", "Groundnut", "Millets"])
-                confidence_factors.append("deep_water_table")
-        
-        # Soil type adjustments
-        if soil_type.lower() in ['clay', 'loamy']:
-            crop_recommendations.extend(["Rice", "Wheat", "Cotton"])
-        elif soil_type.lower() == 'sandy':
-            crop_recommendations.extend(["Groundnut", "Bajra", "Watermelon"])
-        
-        # Calculate most suitable crop
-        from collections import Counter
-        crop_counts = Counter(crop_recommendations)
-        
-        if crop_counts:
-            predicted_crop = crop_counts.most_common(1)[0][0]
-            # Confidence based on number of recommendations and factors
-            confidence_score = min(95, crop_counts.most_common(1)[0][1] * 12 + len(confidence_factors) * 8 + 40)
-            confidence = f"{confidence_score}%"
-        else:
-            predicted_crop = "Mixed Farming"
-            confidence = "70%"
-            
-        return predicted_crop, confidence
-        
-    except Exception as e:
-        print(f"❌ Crop prediction error: {e}")
-        return "Mixed Farming", "60%"
+# Full per-device history, indexed by epoch seconds, for range queries; old
+# readings move to the on-disk archive and are read back from it transparently
+reading_store = TimeSeriesStore(archive=ColumnArchive(ARCHIVE_DIR))
 
-def analyze_water(moisture, soil_type, humidity, distance=None):
-    """Enhanced water analysis with distance-based water table detection"""
-    try:
-        # Base water analysis from moisture
-        if moisture < 20:
-            water_status = "Low"
-            irrigation = "Immediate irrigation required"
-        elif moisture < 40:
-            water_status = "Below Optimal"
-            irrigation = "Light irrigation recommended"
-        elif moisture < 70:
-            water_status = "Optimal"
-            irrigation = "No irrigation needed"
-        else:
-            water_status = "High"
-            irrigation = "Avoid watering - risk of waterlogging"
-        
-        # Enhanced analysis with distance (water table depth)
-        if distance is not None:
-            if distance < 10:  # Very close to water source/high water table
-                water_table = f"Shallow ({distance:.1f}cm) - High water table"
-                if moisture > 60:
-                    irrigation = "No irrigation - natural water available"
-                    water_status = "Naturally High"
-            elif distance < 25:  # Moderate distance
-                water_table = f"Moderate depth ({distance:.1f}cm) - Good water access"
-                if moisture < 30:
-                    irrigation = "Light irrigation sufficient - water table accessible"
-            elif distance < 50:  # Deeper water table
-                water_table = f"Deep ({distance:.1f}cm) - Limited natural water"
-                if moisture < 40:
-                    irrigation = "Regular irrigation needed - deep water table"
-            else:  # Very deep or no water detected
-                water_table = f"Very deep ({distance:.1f}cm) - Rely on irrigation"
-                irrigation = "Frequent irrigation required - no natural water source"
-        else:
-            water_table = "Unknown depth - sensor not available"
-        
-        return water_status, irrigation, water_table
-        
-    except Exception as e:
-        print(f"❌ Water analysis error: {e}")
-        return "Unknown", "Check manually", "Sensor error"
+# Background job moving old readings from reading_store into the archive
+compaction_job = CompactionJob(reading_store, reading_store.archive)
+
+# Rendered read responses, invalidated whenever a reading is stored
+response_cache = ResponseCache()
+
+# Background job that re-analyzes records left stale by rule/model changes
+reanalysis_job = ReanalysisJob(sensor_data_log, on_change=response_cache.bump)
+
+# Per-device moisture trend models used for irrigation scheduling. Created on
+# first use so NumPy isn't imported while the server is starting.
+_moisture_forecaster = None
+_forecaster_lock = threading.Lock()
+
+# In-memory state is pickled here on shutdown and restored on boot
+SNAPSHOT_PATH = os.environ.get("AQUASENSE_SNAPSHOT", f"aquasense_snapshot{NODE_SUFFIX}.pkl")
+
+# Alert rules as changed through /alerts; replaces alert_rules.json on boot
+ALERT_STATE_PATH = os.environ.get("AQUASENSE_ALERT_STATE", f"aquasense_alert_rules{NODE_SUFFIX}.json")
+
+# The debug reloader imports everything twice; set AQUASENSE_DEBUG=0 on the
+# edge gateway for a single-process, faster start.
+DEBUG = os.environ.get("AQUASENSE_DEBUG", "1") == "1"
+
+PORT = int(os.environ.get("AQUASENSE_PORT", "5000"))
+
+# Recently ingested reading keys, so firmware retries aren't stored twice
+seen_readings = SeenSet()
+
+# Rate limits and load shedding applied before a reading is parsed
+admission = AdmissionController()
+
+# MQTT subscriber when AQUASENSE_MQTT_HOST is set, for /admission's counters
+mqtt_ingest = None
+
+# Device-to-node assignment when running as one shard of several
+# (AQUASENSE_CLUSTER / AQUASENSE_NODE); None for a standalone server
+cluster = cluster_from_env()
+
+# Operator alert rules run against every stored reading (see alert_rules.json)
+alert_engine = alert_engine_from_env(ALERT_STATE_PATH)
+
+def get_moisture_forecaster():
+    """Shared MoistureForecaster, importing NumPy on first use"""
+    global _moisture_forecaster
+    with _forecaster_lock:
+        if _moisture_forecaster is None:
+            from irrigation_forecast import MoistureForecaster
+            _moisture_forecaster = MoistureForecaster()
+        return _moisture_forecaster
 
 def get_crop_details(crop_name):
     """Comprehensive crop database with growing details"""
@@ -411,23 +372,48 @@ WEB_TEMPLATE = """
 </html>
 """
 
-@app.route('/', methods=['GET'])
-def home():
-    """Home page with real-time dashboard"""
-    latest_reading = sensor_data_log[-1] if sensor_data_log else None
+_dashboard_template = None
+
+def get_dashboard_template():
+    """WEB_TEMPLATE compiled once, on first use"""
+    global _dashboard_template
+    if _dashboard_template is None:
+        _dashboard_template = app.jinja_env.from_string(WEB_TEMPLATE)
+    return _dashboard_template
+
+def fans_out():
+    """True if this read should cover the whole cluster rather than this shard"""
+    return cluster is not None and request.args.get("scope") != "local"
+
+def render_dashboard(log, total_readings):
+    latest_reading = log[-1] if log else None
     latest_analysis = getattr(latest_reading, 'analysis', None) if latest_reading else None
     
-    return render_template_string(WEB_TEMPLATE, 
-        total_readings=len(sensor_data_log),
+    return render_template(get_dashboard_template(), 
+        total_readings=total_readings,
         current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         latest_reading=latest_reading,
         latest_analysis=latest_analysis,
-        recent_logs=sensor_data_log[-10:] if sensor_data_log else [],
-        sensor_data_log=sensor_data_log,
+        recent_logs=log[-10:] if log else [],
+        sensor_data_log=log,
         get_crop_details=get_crop_details
     )
 
+@response_cache.cached
+def local_dashboard():
+    return render_dashboard(sensor_data_log, len(sensor_data_log))
+
+@app.route('/', methods=['GET'])
+def home():
+    """Home page with real-time dashboard"""
+    if fans_out():
+        # Other shards don't bump our cache generation, so merged views aren't cached
+        merged = cluster_logs()
+        return render_dashboard(merged["all_readings"], merged["total_readings"])
+    return local_dashboard()
+
 @app.route('/test', methods=['GET', 'POST'])
+@response_cache.cached
 def test():
     """Simple test endpoint"""
     if request.method == 'GET':
@@ -450,75 +436,100 @@ def test():
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             })
 
-@app.route('/data', methods=['POST'])
-def receive_data():
-    """Receive sensor data from ESP8266"""
+# Payload keys already stored as record fields
+EXTRACTED_KEYS = {"temp", "temperature", "humidity", "soil_moisture", "moisture", "distance",
+                  "soil_type", "device_id"}
+
+def ingest_reading(data, default_device_id=None, idempotency_header=None, verbose=True):
+    """Validate, de-duplicate, analyze and store one reading; returns (response, status)"""
+    log = print if verbose else (lambda *args, **kwargs: None)
+    
+    if not data or not isinstance(data, dict):
+        return {"error": "Invalid JSON"}, 400
+    
+    # Extract values safely
+    temp = safe_float(data.get("temp") or data.get("temperature"), 25.0)
+    humidity = safe_float(data.get("humidity"), 50.0)
+    moisture = safe_float(data.get("soil_moisture") or data.get("moisture"), 0.1)
+    distance = safe_float(data.get("distance"), -1.0)
+    soil_type = str(data.get("soil_type", "Loamy"))
+    # Older firmware doesn't identify itself; fall back to the sender address
+    device_id = str(data.get("device_id") or default_device_id or "unknown")
+    
+    log(f"🔍 Extracted values:")
+    log(f"   Device: {device_id}")
+    log(f"   Temperature: {temp}°C")
+    log(f"   Humidity: {humidity}%") 
+    log(f"   Moisture: {moisture}%")
+    log(f"   Distance: {distance}cm")
+    log(f"   Soil Type: {soil_type}")
+    
+    # Drop retried/replayed readings before spending any time on them
+    dedup_key = idempotency_key(data, device_id, idempotency_header)
+    if dedup_key is not None:
+        previous = seen_readings.claim(dedup_key)
+        if previous is not None:
+            admission.count_duplicate()
+            log(f"♻️ Duplicate reading {dedup_key[1:]} from {device_id}, skipping analysis")
+            if previous is PENDING:
+                return {"status": "duplicate", "message": "Reading is already being processed"}, 200
+            return dict(previous, duplicate=True), 200
+    
     try:
-        print("\n" + "="*50)
-        print("📡 NEW REQUEST TO /data")
-        print("📩 Raw data:", request.data.decode('utf-8') if request.data else 'No data')
-        print("📋 Headers:", dict(request.headers))
-        
-        # Parse JSON
-        if not request.data:
-            return jsonify({"error": "No data received"}), 400
-            
-        data = request.get_json(force=True)
-        print("📥 Parsed JSON:", data)
-        
-        if not data:
-            return jsonify({"error": "Invalid JSON"}), 400
-        
-        # Extract values safely
-        temp = safe_float(data.get("temp") or data.get("temperature"), 25.0)
-        humidity = safe_float(data.get("humidity"), 50.0)
-        moisture = safe_float(data.get("soil_moisture") or data.get("moisture"), 0.1)
-        distance = safe_float(data.get("distance"), -1.0)
-        soil_type = str(data.get("soil_type", "Loamy"))
-        
-        print(f"🔍 Extracted values:")
-        print(f"   Temperature: {temp}°C")
-        print(f"   Humidity: {humidity}%") 
-        print(f"   Moisture: {moisture}%")
-        print(f"   Distance: {distance}cm")
-        print(f"   Soil Type: {soil_type}")
-        
         # Handle edge cases
         if moisture <= 0:
-            print("⚠️ Moisture is zero or negative, setting to 0.1%")
+            log("⚠️ Moisture is zero or negative, setting to 0.1%")
             moisture = 0.1
+        
+        values = {
+            "temperature": temp,
+            "humidity": humidity,
+            "moisture": moisture,
+            "distance": distance
+        }
+        # Under overload, a reading that says nothing new isn't worth analyzing
+        if admission.shed_near_duplicate(device_id, values):
+            log(f"🪫 Overloaded: shedding near-identical reading from {device_id}")
+            if dedup_key is not None:
+                seen_readings.release(dedup_key)
+            return {"status": "shed", "reason": "near_duplicate"}, 429
             
         # Make predictions with distance integration
-        crop, confidence = predict_crop(temp, humidity, moisture, soil_type, distance)
-        water_status, irrigation, water_table = analyze_water(moisture, soil_type, humidity, distance)
+        analysis = analyze_reading(temp, humidity, moisture, soil_type, distance)
+        
+        now = time.time()
+        get_moisture_forecaster().update(device_id, now, moisture, temp, humidity)
+        # A negative distance means the ultrasonic sensor isn't fitted: store
+        # it as missing so it stays out of rollups, and don't alert on it
+        measured = values if distance >= 0 else {field: value for field, value in values.items()
+                                                 if field != "distance"}
+        reading_store.append(device_id, now, measured, soil_type)
+        alert_engine.evaluate(device_id, now, measured)
         
-        # Store record with analysis
+        # Store record with analysis; raw_data keeps only what the fields above don't
         record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            "epoch": int(now),
+            "device_id": device_id,
             "temperature": temp,
             "humidity": humidity,
             "moisture": moisture,
             "distance": distance,
             "soil_type": soil_type,
-            "raw_data": data,
-            "analysis": {
-                "predicted_crop": crop,
-                "confidence": confidence,
-                "water_status": water_status,
-                "irrigation_needed": irrigation,
-                "water_table_estimate": water_table
-            }
+            "raw_data": {key: value for key, value in data.items() if key not in EXTRACTED_KEYS},
+            "analysis": analysis
         }
         
         sensor_data_log.append(record)
         if len(sensor_data_log) > 100:
             sensor_data_log.pop(0)
+        response_cache.bump()
         
-        print(f"💾 Stored record #{len(sensor_data_log)}")
-        print(f"🤖 Predictions:")
-        print(f"   Crop: {crop} (Confidence: {confidence})")
-        print(f"   Water: {water_status}")
-        print(f"   Irrigation: {irrigation}")
+        log(f"💾 Stored record #{len(sensor_data_log)}")
+        log(f"🤖 Predictions (analysis {analysis['version']}):")
+        log(f"   Crop: {analysis['predicted_crop']} (Confidence: {analysis['confidence']})")
+        log(f"   Water: {analysis['water_status']}")
+        log(f"   Irrigation: {analysis['irrigation_needed']}")
         
         # Create response
         response = {
@@ -532,18 +543,91 @@ def receive_data():
                 "soil_type": soil_type
             },
             "analysis": {
-                "predicted_crop": crop,
-                "confidence": confidence,
-                "water_status": water_status,
-                "irrigation_needed": irrigation,
-                "water_table_estimate": water_table
+                "predicted_crop": analysis["predicted_crop"],
+                "confidence": analysis["confidence"],
+                "water_status": analysis["water_status"],
+                "irrigation_needed": analysis["irrigation_needed"],
+                "water_table_estimate": analysis["water_table_estimate"]
             },
             "total_readings": len(sensor_data_log)
         }
+    except Exception:
+        # Let a retry of this reading through again
+        if dedup_key is not None:
+            seen_readings.release(dedup_key)
+        raise
+    
+    if dedup_key is not None:
+        seen_readings.complete(dedup_key, response)
+    return response, 200
+
+def redirect_to_owner(device_id):
+    """307 to the node owning device_id, or None if it's ours"""
+    if cluster is None or not device_id or cluster.owns(device_id):
+        return None
+    # 307 keeps the method and body, so the device re-POSTs the same reading
+    return redirect(cluster.url_for(device_id, request.full_path.rstrip("?")), code=307)
+
+@app.before_request
+def admit_sensor_reading():
+    """Route /data to the device's shard, then rate-limit it before the body is parsed"""
+    if request.endpoint != 'receive_data':
+        return None
+    device_id = request.headers.get("X-Device-Id")
+    routed = redirect_to_owner(device_id)
+    if routed is not None:
+        return routed
+    # Without the header only the global limit applies here: readings from
+    # older firmware behind one gateway would otherwise share a single device
+    # bucket. Their own bucket is charged once the body names the device.
+    admitted, reason, retry_after = admission.admit(device_id or None)
+    if admitted:
+        return None
+    return shed_response(reason, retry_after)
+
+def shed_response(reason, retry_after):
+    response = jsonify({"status": "shed", "reason": reason, "retry_after": round(retry_after, 2)})
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+@app.route('/data', methods=['POST'])
+def receive_data():
+    """Receive sensor data from ESP8266"""
+    try:
+        print("\n" + "="*50)
+        print("📡 NEW REQUEST TO /data")
+        print("📩 Raw data:", request.data.decode('utf-8') if request.data else 'No data')
+        print("📋 Headers:", dict(request.headers))
+        
+        # Parse JSON
+        if not request.data:
+            return jsonify({"error": "No data received"}), 400
+            
+        data = request.get_json(force=True)
+        print("📥 Parsed JSON:", data)
         
-        print("✅ Sending successful response")
+        # Firmware without the X-Device-Id header can only be routed and
+        # rate-limited per device now
+        if not request.headers.get("X-Device-Id"):
+            body_device = data.get("device_id") if isinstance(data, dict) else None
+            routed = redirect_to_owner(body_device)
+            if routed is not None:
+                # The owning shard charges it again
+                admission.refund_global()
+                print(f"🔀 Redirecting {body_device} to its shard")
+                return routed
+            admitted, reason, retry_after = admission.admit_device(
+                str(body_device or request.remote_addr or "unknown"))
+            if not admitted:
+                print(f"🚦 Shedding reading: {reason}")
+                return shed_response(reason, retry_after)
+        
+        response, status = ingest_reading(data, request.remote_addr, request.headers.get("Idempotency-Key"))
+        
+        if status == 200:
+            print("✅ Sending successful response")
         print("="*50 + "\n")
-        return jsonify(response), 200
+        return jsonify(response), status
         
     except Exception as e:
         print(f"❌ ERROR in /data endpoint: {e}")
@@ -561,27 +645,350 @@ def receive_data():
         print("="*50 + "\n")
         return jsonify(error_response), 200  # Return 200 to help ESP8266
 
-@app.route('/logs', methods=['GET'])
-def get_logs():
-    """Get all sensor data logs"""
-    return jsonify({
+def local_logs():
+    return {
         "total_readings": len(sensor_data_log),
         "latest_readings": sensor_data_log[-10:] if sensor_data_log else [],
         "all_readings": sensor_data_log
+    }
+
+def cluster_logs():
+    """/logs of every shard, merged by reading time"""
+    return merge_logs(cluster.fan_out("/logs?scope=local", local_logs))
+
+@response_cache.cached
+def local_logs_view():
+    return jsonify(local_logs())
+
+def device_logs(device_id):
+    """Stored readings of one device over a time range, archived ones included"""
+    routed = redirect_to_owner(device_id)
+    if routed is not None:
+        return routed
+    try:
+        end = parse_time(request.args.get("end"), int(time.time()) + 1)
+        if request.args.get("last"):
+            start = end - parse_duration(request.args["last"])
+        else:
+            start = parse_time(request.args.get("start"), 0)
+        limit = int(request.args.get("limit", 1000))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    readings = reading_store.readings(device_id, start, end)
+    return jsonify({
+        "device": device_id,
+        "start": start,
+        "end": end,
+        "total_readings": len(readings),
+        "truncated": len(readings) > limit,
+        "readings": readings[-limit:] if limit > 0 else []
     })
 
+@app.route('/logs', methods=['GET'])
+def get_logs():
+    """Get all sensor data logs, or ?device=<id>&last=7d for one device's history"""
+    if request.args.get("device"):
+        return device_logs(request.args["device"])
+    if fans_out():
+        return jsonify(cluster_logs())
+    return local_logs_view()
+
+@app.route('/reanalyze', methods=['GET', 'POST'])
+def reanalyze():
+    """Start (POST) or check (GET) re-analysis of out-of-date records"""
+    if request.method == 'POST':
+        started = reanalysis_job.start()
+        return jsonify({"started": started, "progress": reanalysis_job.progress()}), 202 if started else 200
+    return jsonify(reanalysis_job.progress())
+
+@app.route('/schedule', methods=['GET'])
+def irrigation_schedule():
+    """Forecast-driven irrigation schedule for all devices"""
+    horizon = safe_float(request.args.get("horizon"), 72.0)
+    
+    def local_schedule():
+        forecaster = get_moisture_forecaster()
+        return {"devices": len(forecaster.devices), "schedule": forecaster.schedule(horizon_hours=horizon)}
+    
+    if fans_out():
+        result = merge_schedules(cluster.fan_out(f"/schedule?scope=local&horizon={horizon}", local_schedule))
+    else:
+        result = local_schedule()
+    return jsonify(dict(result,
+        generated_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        horizon_hours=horizon
+    ))
+
+def parse_time(value, default):
+    """Epoch seconds from an epoch number or a "%Y-%m-%d %H:%M:%S" string"""
+    if value is None or value == "":
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp())
+    return int(finite_float(number))
+
+@app.route('/query', methods=['GET'])
+def query_readings():
+    """Range aggregate of one field for one device"""
+    device_id = request.args.get("device")
+    field = request.args.get("field", "moisture")
+    if not device_id:
+        return jsonify({"error": "device is required", "devices": all_devices()}), 400
+    routed = redirect_to_owner(device_id)
+    if routed is not None:
+        return routed
+    try:
+        end = parse_time(request.args.get("end"), int(time.time()) + 1)
+        if request.args.get("last"):
+            start = end - parse_duration(request.args["last"])
+        else:
+            start = parse_time(request.args.get("start"), 0)
+        result = reading_store.aggregate(device_id, field, start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(dict(result, device=device_id, field=field, start=start, end=end))
+
+def save_alert_rules():
+    """Persist a rule change; it is already live, so a failed save is only logged"""
+    try:
+        alert_engine.save()
+    except OSError as e:
+        print(f"❌ Failed to save alert rules to {ALERT_STATE_PATH}: {e}")
+
+@app.route('/alerts', methods=['GET', 'POST'])
+def alerts():
+    """Alert rules, currently firing alerts and recent events; POST adds a rule on every node"""
+    if request.method == 'POST':
+        spec = request.get_json(force=True)
+        try:
+            rule = Rule.from_dict(spec)
+        except RuleError as e:
+            return jsonify({"error": f"Invalid rule: {e}"}), 400
+        alert_engine.add_rule(rule)
+        save_alert_rules()
+        print(f"🚨 Alert rule {rule.name}: {rule.when}")
+        if fans_out():
+            # Readings are evaluated on their owner's shard, so every node needs the rule
+            results = cluster.fan_out("/alerts?scope=local", rule.to_dict, payload=rule.to_dict())
+            return jsonify(dict(rule.to_dict(), nodes=sorted(name for name, result in results.items() if result))), 201
+        return jsonify(rule.to_dict()), 201
+    return jsonify({
+        "rules": [rule.to_dict() for rule in alert_engine.rules.values()],
+        "firing": alert_engine.firing(),
+        "recent_events": alert_engine.events[-20:]
+    })
+
+@app.route('/alerts/<name>', methods=['DELETE'])
+def delete_alert_rule(name):
+    """Remove a rule, from every node unless scope=local"""
+    removed = alert_engine.remove_rule(name)
+    if removed:
+        save_alert_rules()
+    if fans_out():
+        results = cluster.fan_out(f"/alerts/{urllib.parse.quote(name, safe='')}?scope=local",
+                                  lambda: {"deleted": name} if removed else None, method="DELETE")
+        removed = any(results.values())
+    if not removed:
+        return jsonify({"error": f"No alert rule {name!r}"}), 404
+    return jsonify({"deleted": name})
+
+@app.route('/archive', methods=['GET', 'POST'])
+def archive_status():
+    """Archive size and last compaction; POST runs a compaction pass now"""
+    if request.method == 'POST':
+        compaction_job.run_once()
+        response_cache.bump()
+    return jsonify(dict(reading_store.archive.stats(),
+                        archive_after_seconds=compaction_job.after_seconds,
+                        last_compaction=compaction_job.last_run))
+
+@app.route('/admission', methods=['GET'])
+def admission_stats():
+    """Admitted and shed reading counters (MQTT's separately: it waits instead of shedding)"""
+    stats = admission.stats()
+    if mqtt_ingest is not None:
+        stats["mqtt"] = mqtt_ingest.stats()
+    return jsonify(stats)
+
+def local_devices():
+    """Devices with any state on this node"""
+    devices = set(reading_store.devices())
+    devices.update(record.get("device_id") for record in sensor_data_log if record.get("device_id"))
+    if _moisture_forecaster is not None:
+        devices.update(_moisture_forecaster.devices)
+    return sorted(devices)
+
+def all_devices():
+    if not fans_out():
+        return reading_store.devices()
+    results = cluster.fan_out("/cluster/devices", lambda: {"devices": reading_store.devices()})
+    return sorted(d for result in results.values() if result for d in result["devices"])
+
+def export_devices(device_ids):
+    """Remove the given devices' state from this node and return it as JSON-able data"""
+    wanted = set(device_ids)
+    exported = {device_id: {"readings": reading_store.pop_device(device_id), "records": []}
+                for device_id in wanted}
+    kept = []
+    for record in list(sensor_data_log):
+        if record.get("device_id") in wanted:
+            exported[record["device_id"]]["records"].append(record)
+        else:
+            kept.append(record)
+    sensor_data_log[:] = kept
+    if _moisture_forecaster is not None:
+        for device_id in wanted:
+            exported[device_id]["forecaster"] = _moisture_forecaster.pop_device(device_id)
+    response_cache.bump()
+    return exported
+
+def import_devices(exported):
+    """Merge state from another node's export_devices() into this node"""
+    records = list(sensor_data_log)
+    for device_id, state in exported.items():
+        reading_store.import_readings(device_id, state["readings"])
+        records.extend(state["records"])
+        if state.get("forecaster"):
+            get_moisture_forecaster().merge_device(device_id, state["forecaster"])
+    records.sort(key=lambda record: record.get("epoch", 0))
+    sensor_data_log[:] = records[-100:]
+    response_cache.bump()
+
+@app.route('/cluster', methods=['GET'])
+def cluster_status():
+    """This node's shard membership"""
+    if cluster is None:
+        return jsonify({"clustered": False, "devices": len(local_devices())})
+    return jsonify({"clustered": True, "node": cluster.node, "nodes": cluster.nodes,
+                    "devices": len(local_devices())})
+
+@app.route('/cluster/devices', methods=['GET'])
+def cluster_devices():
+    return jsonify({"devices": local_devices()})
+
+@app.route('/cluster/ring', methods=['POST'])
+def cluster_ring():
+    """Switch to a new membership (sent by sharding.rebalance)"""
+    if cluster is None:
+        return jsonify({"error": "Not running as a cluster node"}), 400
+    nodes = (request.get_json(force=True) or {}).get("nodes")
+    if not nodes:
+        return jsonify({"error": "nodes is required"}), 400
+    cluster.set_nodes(nodes)
+    response_cache.bump()
+    print(f"🔀 Cluster membership is now {', '.join(nodes)}")
+    return jsonify({"node": cluster.node, "nodes": cluster.nodes})
+
+@app.route('/cluster/export', methods=['POST'])
+def cluster_export():
+    """Hand over the listed devices' state, removing it from this node"""
+    device_ids = (request.get_json(force=True) or {}).get("devices", [])
+    exported = export_devices(device_ids)
+    print(f"📤 Exported {len(exported)} devices")
+    return jsonify(exported)
+
+@app.route('/cluster/import', methods=['POST'])
+def cluster_import():
+    """Take over devices exported by another node"""
+    exported = request.get_json(force=True) or {}
+    import_devices(exported)
+    print(f"📥 Imported {len(exported)} devices")
+    return jsonify({"imported": len(exported)})
+
+def snapshot_state():
+    """Picklable copy of the in-memory stores"""
+    state = {"sensor_data_log": list(sensor_data_log), "reading_store": reading_store.series}
+    if _moisture_forecaster is not None:
+        state["moisture_forecaster"] = _moisture_forecaster.get_state()
+    return state
+
+def restore_state(state):
+    """Load stores saved by snapshot_state()"""
+    sensor_data_log[:] = state.get("sensor_data_log", [])
+    reading_store.series = state.get("reading_store", {})
+    if "moisture_forecaster" in state:
+        get_moisture_forecaster().set_state(state["moisture_forecaster"])
+    response_cache.bump()
+
+def save_state():
+    """Write the shutdown snapshot"""
+    try:
+        save_snapshot(SNAPSHOT_PATH, snapshot_state())
+        print(f"💾 Saved {len(sensor_data_log)} readings to {SNAPSHOT_PATH}")
+    except Exception as e:
+        print(f"❌ Failed to save snapshot: {e}")
+
+def warm_up():
+    """Import heavy modules in the background once the server is accepting requests"""
+    get_moisture_forecaster()
+    with app.app_context():
+        get_dashboard_template()
+
+def start_serving_process():
+    """Restore the last snapshot and arrange for a new one on shutdown"""
+    started = time.time()
+    state = load_snapshot(SNAPSHOT_PATH)
+    if state is not None:
+        restore_state(state)
+        print(f"♻️ Restored {len(sensor_data_log)} readings in {time.time() - started:.3f}s")
+        # Records analyzed by an older rule/model version get refreshed
+        reanalysis_job.start()
+    atexit.register(save_state)
+    # Turn SIGTERM into a normal exit so atexit handlers run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    
+    compaction_job.after_seconds = parse_duration(os.environ.get("AQUASENSE_ARCHIVE_AFTER", "7d"))
+    compaction_job.interval = parse_duration(os.environ.get("AQUASENSE_ARCHIVE_EVERY", "1h"))
+    compaction_job.start()
+    
+    mqtt_host = os.environ.get("AQUASENSE_MQTT_HOST")
+    if mqtt_host:
+        start_mqtt(mqtt_host, int(os.environ.get("AQUASENSE_MQTT_PORT", "1883")))
+
+def start_mqtt(host, port):
+    """MQTT ingest alongside HTTP; a broker problem is logged, never fatal to HTTP"""
+    global mqtt_ingest
+    try:
+        from mqtt_ingest import MQTTIngest
+        if cluster is None:
+            mqtt_ingest = MQTTIngest(ingest_reading, host=host, port=port, admission=admission)
+        else:
+            # Every shard sees every topic and keeps only its own devices; the
+            # client id must differ per shard or the broker drops the others.
+            mqtt_ingest = MQTTIngest(ingest_reading, host=host, port=port, admission=admission,
+                                     client_id=f"aquasense-server-{cluster.node}", accept=cluster.owns)
+        mqtt_ingest.start()
+    except Exception as e:
+        print(f"❌ MQTT ingest not started ({host}:{port}): {e}")
+
 if __name__ == '__main__':
     print("🌱 Starting AquaSense Flask Server...")
     print("🔧 Server will run on:")
-    print("   • http://localhost:5000")
-    print("   • http://127.0.0.1:5000") 
-    print("   • Your network IP on port 5000")
+    print(f"   • http://localhost:{PORT}")
+    print(f"   • http://127.0.0.1:{PORT}") 
+    print(f"   • Your network IP on port {PORT}")
     print("📡 ESP8266 can send data to /data endpoint")
+    print("📶 or publish to MQTT aquasense/<device_id>/data (set AQUASENSE_MQTT_HOST)")
     print("🧪 Test with /test endpoint")
+    print("🔁 Re-analyze stale records with POST /reanalyze")
+    print("🚿 Irrigation schedule at /schedule")
+    print("📈 Range aggregates at /query?device=<id>&field=moisture&last=7d")
+    print("🗄️ Device history at /logs?device=<id>&last=30d, archive status at /archive")
+    print("🚦 Rate limiting and shed counters at /admission")
+    print(f"🚨 {len(alert_engine.rules)} alert rules, manage them at /alerts")
+    if cluster is not None:
+        print(f"🌐 Shard {cluster.node} of {', '.join(cluster.nodes)} (see /cluster)")
     print("="*50)
     
+    # With the debug reloader only the child process serves requests
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_serving_process()
+    
     try:
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
     except Exception as e:
         print(f"❌ Failed to start server: {e}")
         traceback.print_exc()
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""
+Cold tier for old readings: compressed columnar files with a stats manifest.
+
+A compaction pass moves every reading older than a cutoff (aligned to a day)
+out of the in-memory TimeSeriesStore into one .npz file per device and day.
+Timestamps are stored as a base plus small unsigned deltas, soil_type as a
+dictionary plus integer codes, and the whole file is zlib-compressed.
+manifest.json records each file's device, time range and per-field
+count/sum/min/max, so queries skip files outside their range without opening
+them and answer aggregates over fully covered files from the manifest alone.
+
+NumPy is only imported when a file is actually written or read.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from timeseries_store import DAY, FIELDS, is_missing, merge_stats
+
+MANIFEST = "manifest.json"
+
+def device_dir_name(device_id):
+    """Filesystem-safe, collision-free directory name for a device id"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", device_id)[:40]
+    return f"{safe}-{hashlib.sha1(device_id.encode('utf-8')).hexdigest()[:8]}"
+
+def smallest_uint(max_value):
+    import numpy as np
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def encode_columns(ts, columns, soil_types):
+    """Arrays to save for one file: delta timestamps, raw floats, dictionary soil types"""
+    import numpy as np
+    ts = np.asarray(ts, dtype=np.int64)
+    deltas = np.diff(ts, prepend=ts[0])
+    soil_values, soil_codes = np.unique(np.asarray(soil_types, dtype=str), return_inverse=True)
+    arrays = {
+        "ts_base": ts[:1],
+        "ts_delta": deltas.astype(smallest_uint(int(deltas.max()))),
+        "soil_values": soil_values,
+        "soil_codes": soil_codes.astype(smallest_uint(len(soil_values))),
+    }
+    for field in FIELDS:
+        arrays[field] = np.asarray(columns[field], dtype=np.float64)
+    return arrays
+
+def decode_columns(arrays):
+    """(ts, {field: column}, soil_types) from encode_columns() arrays"""
+    import numpy as np
+    ts = arrays["ts_base"][0] + np.cumsum(arrays["ts_delta"], dtype=np.int64)
+    soil_types = arrays["soil_values"][arrays["soil_codes"]]
+    return ts, {field: arrays[field] for field in FIELDS}, soil_types
+
+def column_stats(columns):
+    """Per-field count/sum/min/max of the values present (min/max None if none are)"""
+    stats = {}
+    for field in FIELDS:
+        values = [value for value in columns[field] if not is_missing(value)]
+        stats[field] = {"count": len(values), "sum": float(sum(values)),
+                        "min": float(min(values)) if values else None,
+                        "max": float(max(values)) if values else None}
+    return stats
+
+class ColumnArchive:
+    """Archived readings on disk, indexed by an in-memory copy of the manifest"""
+
+    def __init__(self, directory, cache_files=8):
+        self.directory = directory
+        self.cache_files = cache_files
+        # device_id -> manifest entries sorted by start
+        self.entries = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes manifest writes, which happen outside _lock
+        self._save_lock = threading.Lock()
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for entry in json.load(f)["files"]:
+                    self.entries.setdefault(entry["device_id"], []).append(entry)
+
+    def save(self):
+        """Persist the manifest; queries keep running while it is written"""
+        with self._save_lock:
+            with self._lock:
+                files = [entry for entries in self.entries.values() for entry in entries]
+            path = os.path.join(self.directory, MANIFEST)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"files": files}, f, indent=1)
+            os.replace(path + ".tmp", path)
+
+    def devices(self):
+        with self._lock:
+            return [device_id for device_id, entries in self.entries.items() if entries]
+
+    def write(self, device_id, ts, columns, soil_types):
+        """Write one file of sorted readings; returns its manifest entry (not yet registered)"""
+        import numpy as np
+        name = f"{ts[0]}-{ts[-1]}"
+        relative = os.path.join(device_dir_name(device_id), f"{name}.npz")
+        suffix = 1
+        # A later pass can archive late readings for an already archived range
+        while os.path.exists(os.path.join(self.directory, relative)):
+            suffix += 1
+            relative = os.path.join(device_dir_name(device_id), f"{name}-{suffix}.npz")
+        path = os.path.join(self.directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                np.savez_compressed(f, **encode_columns(ts, columns, soil_types))
+        except BaseException:
+            os.remove(path + ".tmp")
+            raise
+        os.replace(path + ".tmp", path)
+        return {
+            "file": relative,
+            "device_id": device_id,
+            "start": int(ts[0]),
+            "end": int(ts[-1]),
+            "rows": len(ts),
+            "bytes": os.path.getsize(path),
+            "stats": column_stats(columns),
+        }
+
+    def register(self, entries):
+        """Make written files visible to queries (in memory only; save() persists them)"""
+        with self._lock:
+            for entry in entries:
+                device_entries = self.entries.setdefault(entry["device_id"], [])
+                device_entries.append(entry)
+                device_entries.sort(key=lambda e: e["start"])
+
+    def discard(self, entries):
+        """Delete written files that were never registered"""
+        for entry in entries:
+            path = os.path.join(self.directory, entry["file"])
+            if os.path.exists(path):
+                os.remove(path)
+
+    def files(self, device_id, start, end):
+        """(entries overlapping [start, end), number of the device's files pruned)"""
+        with self._lock:
+            entries = self.entries.get(device_id, [])
+            overlapping = [e for e in entries if e["start"] < end and e["end"] >= start]
+            return overlapping, len(entries) - len(overlapping)
+
+    def load(self, entry):
+        """Decoded (ts, columns, soil_types) of one file, via a small LRU"""
+        import numpy as np
+        with self._lock:
+            cached = self._cache.get(entry["file"])
+            if cached is not None:
+                self._cache.move_to_end(entry["file"])
+                return cached
+        with np.load(os.path.join(self.directory, entry["file"])) as arrays:
+            decoded = decode_columns({name: arrays[name] for name in arrays.files})
+        with self._lock:
+            self._cache[entry["file"]] = decoded
+            while len(self._cache) > self.cache_files:
+                self._cache.popitem(last=False)
+        return decoded
+
+    def readings(self, entries, start, end):
+        """Rows with start <= ts < end from the given files, in time order"""
+        rows = []
+        for entry in entries:
+            ts, columns, soil_types = self.load(entry)
+            lo, hi = ts.searchsorted(start), ts.searchsorted(end)
+            for i in range(lo, hi):
+                row = {field: None if is_missing(columns[field][i]) else float(columns[field][i])
+                       for field in FIELDS}
+                row["ts"] = int(ts[i])
+                row["soil_type"] = str(soil_types[i])
+                rows.append(row)
+        return rows
+
+    def aggregate(self, entries, field, start, end, total, used):
+        """Merge a field's stats over [start, end) from the given files into total"""
+        for entry in entries:
+            if start <= entry["start"] and entry["end"] < end:
+                # Whole file in range: the manifest already has the answer
+                stats = entry["stats"][field]
+                merge_stats(total, stats["count"], stats["sum"], stats["min"], stats["max"])
+                used["archive_stats"] += 1
+                continue
+            ts, columns, _ = self.load(entry)
+            lo, hi = ts.searchsorted(start), ts.searchsorted(end)
+            values = columns[field][lo:hi]
+            values = values[values == values]
+            if len(values):
+                merge_stats(total, len(values), float(values.sum()), float(values.min()), float(values.max()))
+            used["archive_files"] += 1
+
+    def pop_device(self, device_id):
+        """Remove a device's files and return their readings (for moving it to another node)"""
+        with self._lock:
+            entries = self.entries.pop(device_id, [])
+        if entries:
+            self.save()
+        rows = self.readings(entries, float("-inf"), float("inf"))
+        for entry in entries:
+            os.remove(os.path.join(self.directory, entry["file"]))
+            with self._lock:
+                self._cache.pop(entry["file"], None)
+        return rows
+
+    def stats(self):
+        with self._lock:
+            entries = [entry for entries in self.entries.values() for entry in entries]
+        return {
+            "devices": len(self.devices()),
+            "files": len(entries),
+            "rows": sum(entry["rows"] for entry in entries),
+            "bytes": sum(entry["bytes"] for entry in entries),
+        }
+
+class CompactionJob:
+    """Periodically moves readings older than `after_seconds` into the archive"""
+
+    def __init__(self, store, archive, after_seconds=7 * DAY, interval=3600.0):
+        self.store = store
+        self.archive = archive
+        self.after_seconds = after_seconds
+        self.interval = interval
+        self.last_run = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run_once(self, now=None):
+        """Archive everything before the cutoff; returns {"files", "rows", "cutoff"}"""
+        with self._lock:
+            now = time.time() if now is None else now
+            # Day-aligned so no rollup bucket straddles the cutoff
+            cutoff = int(now - self.after_seconds) // DAY * DAY
+            files = rows = 0
+            try:
+                for device_id in self.store.devices():
+                    ts, columns, soil_types = self.store.columns_before(device_id, cutoff)
+                    if not ts:
+                        continue
+                    entries = []
+                    try:
+                        lo = 0
+                        while lo < len(ts):
+                            day_end = ts[lo] - ts[lo] % DAY + DAY
+                            hi = lo
+                            while hi < len(ts) and ts[hi] < day_end:
+                                hi += 1
+                            entries.append(self.archive.write(
+                                device_id, ts[lo:hi], {field: columns[field][lo:hi] for field in FIELDS},
+                                soil_types[lo:hi]))
+                            lo = hi
+                    except BaseException:
+                        # The readings stay in memory; don't leave half a device on disk
+                        self.archive.discard(entries)
+                        raise
+                    # Registering and dropping together keeps queries from seeing
+                    # these readings twice, or not at all
+                    if not self.store.drop_before(device_id, cutoff, len(ts),
+                                                  then=lambda entries=entries: self.archive.register(entries)):
+                        # A late reading landed before the cutoff meanwhile; next pass
+                        self.archive.discard(entries)
+                        continue
+                    files += len(entries)
+                    rows += len(ts)
+            finally:
+                # One manifest write per pass, outside the store lock
+                if files:
+                    self.archive.save()
+            self.last_run = {"files": files, "rows": rows, "cutoff": cutoff, "at": now}
+            if rows:
+                print(f"🗄️ Archived {rows} readings into {files} files (before {cutoff})")
+            return self.last_run
+
+    def start(self):
+        """Run a compaction pass every `interval` seconds in the background"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="compaction", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Compaction failed: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,76 @@
+"""
+Benchmark: readings per second per core, HTTP POST /data vs MQTT ingest.
+
+Both paths run in this process on one core: HTTP through Flask's test client
+(routing, request parsing, JSON response), MQTT through the in-process
+broker stand-in and MQTTIngest's batched drain. Server logging is silenced
+for both so it doesn't dominate the numbers.
+
+    python bench_ingest.py --readings 5000
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import app_fixed
+from admission import AdmissionController
+from mqtt_ingest import InProcessBroker, MQTTIngest
+
+def make_reading(i):
+    return {
+        "temp": 20 + i % 15,
+        "humidity": 40 + i % 40,
+        "soil_moisture": 10 + i % 70,
+        "distance": 5 + i % 50,
+        "soil_type": "Sandy",
+        "device_id": f"bench-{i % 50}",
+        "boot": 1,
+        "seq": i
+    }
+
+def bench_http(readings):
+    client = app_fixed.app.test_client()
+    bodies = [json.dumps(make_reading(i)) for i in range(readings)]
+    started = time.perf_counter()
+    for body in bodies:
+        client.post("/data", data=body, content_type="application/json")
+    return time.perf_counter() - started
+
+def bench_mqtt(readings, batch_size):
+    broker = InProcessBroker()
+    ingest = MQTTIngest(app_fixed.ingest_reading, client=broker.client(), batch_size=batch_size)
+    ingest.client.connect("in-process", 0)
+    payloads = [(f"aquasense/bench-{i % 50}/data", json.dumps(make_reading(i + readings)))
+                for i in range(readings)]
+    started = time.perf_counter()
+    for topic, payload in payloads:
+        broker.publish(topic, payload, qos=1)
+    while ingest.drain(timeout=0):
+        pass
+    elapsed = time.perf_counter() - started
+    assert ingest.ingested == readings and not broker.unacked
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP and MQTT ingest throughput")
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    # Measure the ingest pipeline itself, not the rate limits in front of it
+    unlimited = float("inf")
+    app_fixed.admission = AdmissionController(unlimited, unlimited, unlimited, unlimited)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        http_seconds = bench_http(args.readings)
+        mqtt_seconds = bench_mqtt(args.readings, args.batch_size)
+
+    print(f"📊 {args.readings} readings, single core")
+    print(f"   HTTP /data : {args.readings / http_seconds:10.0f} readings/s")
+    print(f"   MQTT       : {args.readings / mqtt_seconds:10.0f} readings/s")
+    print(f"   Speed-up   : {http_seconds / mqtt_seconds:10.1f}x")
+
+if __name__ == "__main__":
+    main()
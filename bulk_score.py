@@ -0,0 +1,212 @@
+"""
+Offline bulk scoring of sensor dumps in the data_core.csv schema.
+
+Streams the input in chunks, scores every row with the same rules as the
+server (analysis.predict_crop / analysis.analyze_water) and, when a trained
+forest has been exported (train_model.py), adds its crop prediction. Chunks are scored in parallel
+worker processes and written out in input order as they complete, with a
+bounded number of chunks in flight, so memory stays flat for any file size.
+
+    python bulk_score.py data_core.csv scored.csv
+    python bulk_score.py dump.parquet scored.parquet --workers 8 --model crop_forest/
+
+Parquet input/output needs pyarrow.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import model_store
+from analysis import analyze_reading, predict_crop_model, safe_float
+
+# data_core.csv column names (including the dataset's "Temparature" spelling)
+INPUT_COLUMNS = {
+    "temperature": ("Temparature", "Temperature", "temperature", "temp"),
+    "humidity": ("Humidity", "humidity"),
+    "moisture": ("Moisture", "moisture", "soil_moisture"),
+    "soil_type": ("Soil Type", "soil_type"),
+    "distance": ("Distance", "distance"),
+}
+
+OUTPUT_COLUMNS = ["predicted_crop", "confidence", "water_status", "irrigation_needed",
+                  "water_table_estimate"]
+
+_model = None
+
+def resolve_columns(header):
+    """Index of each input field in header (None for optional missing ones)"""
+    indexes = {}
+    for field, names in INPUT_COLUMNS.items():
+        indexes[field] = next((header.index(n) for n in names if n in header), None)
+    missing = [f for f in ("temperature", "humidity", "moisture") if indexes[f] is None]
+    if missing:
+        raise ValueError(f"Input is missing columns for: {', '.join(missing)}")
+    return indexes
+
+def init_worker(model_path):
+    """Load the model once per worker process"""
+    global _model
+    if model_path:
+        _model = model_store.load_forest(model_path)
+
+def score_chunk(rows, columns):
+    """Score a list of input rows; returns the output columns for each row"""
+    inputs = []
+    for row in rows:
+        distance = row[columns["distance"]] if columns["distance"] is not None else None
+        inputs.append((
+            safe_float(row[columns["temperature"]], 25.0),
+            safe_float(row[columns["humidity"]], 50.0),
+            safe_float(row[columns["moisture"]], 0.1),
+            str(row[columns["soil_type"]]) if columns["soil_type"] is not None else "Loamy",
+            safe_float(distance, None) if distance not in (None, "") else None,
+        ))
+
+    results = []
+    for inputs_row in inputs:
+        analysis = analyze_reading(*inputs_row, use_model=False)
+        results.append([analysis[c] for c in OUTPUT_COLUMNS])
+    if _model is not None:
+        # One batched forest evaluation per chunk
+        crops = predict_crop_model([row[:4] for row in inputs], _model)
+        for result, crop in zip(results, crops):
+            result.append(crop or "")
+    return results
+
+def read_csv(path, chunk_size):
+    """(header, iterator of row chunks) for a CSV file"""
+    f = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        f.close()
+        raise ValueError(f"{path} is empty input")
+
+    def chunks():
+        with f:
+            chunk = []
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+    return header, chunks()
+
+def read_parquet(path, chunk_size):
+    """(header, iterator of row chunks) for a Parquet file"""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    header = parquet_file.schema_arrow.names
+
+    def chunks():
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            columns = [batch.column(i).to_pylist() for i in range(batch.num_columns)]
+            yield [list(row) for row in zip(*columns)]
+    return header, chunks()
+
+class CSVWriter:
+    def __init__(self, path, header):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    def __init__(self, path, header):
+        import pyarrow.parquet as pq
+        self.path = path
+        self.header = header
+        self.pq = pq
+        self.writer = None
+
+    def write(self, rows):
+        import pyarrow as pa
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(self.header)}
+        table = pa.table(columns)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+def scored_chunks(chunks, columns, workers, model_path):
+    """Yield (chunk, results) pairs in input order"""
+    if workers == 1:
+        # No point paying for inter-process transfer on a single core
+        init_worker(model_path)
+        for chunk in chunks:
+            yield chunk, score_chunk(chunk, columns)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(model_path,)) as pool:
+        # The deque bounds memory to a few chunks per worker and keeps
+        # results in input order.
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(score_chunk, chunk, columns)))
+            if len(in_flight) >= workers * 2:
+                done, future = in_flight.popleft()
+                yield done, future.result()
+        while in_flight:
+            done, future = in_flight.popleft()
+            yield done, future.result()
+
+def score_file(input_path, output_path, chunk_size=20000, workers=None, model_path=None):
+    """Score input_path into output_path; returns the number of rows scored"""
+    workers = workers or os.cpu_count() or 1
+    if model_path is None and model_store.forest_version() is not None:
+        model_path = model_store.FOREST_DIR
+    if model_path is not None and model_store.forest_version(model_path) is None:
+        raise ValueError(f"No exported forest in {model_path}")
+    header, chunks = (read_parquet if is_parquet(input_path) else read_csv)(input_path, chunk_size)
+    columns = resolve_columns(header)
+    out_header = header + OUTPUT_COLUMNS + (["model_crop"] if model_path else [])
+    writer = (ParquetWriter if is_parquet(output_path) else CSVWriter)(output_path, out_header)
+
+    total = 0
+    started = time.time()
+    try:
+        for chunk, results in scored_chunks(chunks, columns, workers, model_path):
+            writer.write([row + result for row, result in zip(chunk, results)])
+            total += len(chunk)
+            print(f"📊 {total} rows scored ({total / (time.time() - started):.0f} rows/s)")
+    finally:
+        writer.close()
+    print(f"✅ Scored {total} rows in {time.time() - started:.1f}s -> {output_path}")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet sensor dump with crop and water recommendations")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--model", default=None,
+                        help="forest exported by train_model.py (default: crop_forest/ when present)")
+    args = parser.parse_args()
+    try:
+        score_file(args.input, args.output, args.chunk_size, args.workers, args.model)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Flatten a trained sklearn RandomForestClassifier into NumPy node arrays.
+
+All trees are concatenated into one set of contiguous arrays (feature,
+threshold, children, leaf class probabilities) saved as .npy files that
+load memory-mapped. CompiledForest evaluates them with plain NumPy, giving
+the same predictions as sklearn without its per-call validation and joblib
+overhead, and without needing sklearn installed on the gateway.
+
+    python forest_compiler.py model.pkl crop_forest/
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+ARRAYS = ("feature", "threshold", "children", "value", "roots", "classes")
+
+LEAF = -1
+
+def flatten_forest(model):
+    """Dict of flat node arrays for a fitted RandomForestClassifier"""
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left < 0
+        features.append(np.where(is_leaf, LEAF, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        # Interleaved [left, right] so the next node is children[2 * node + went_right]
+        pairs = np.column_stack([tree.children_left, tree.children_right]) + offset
+        children.append(np.where(is_leaf[:, None], -1, pairs).astype(np.int32).ravel())
+        # Same normalization as DecisionTreeClassifier.predict_proba()
+        value = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+        roots.append(offset)
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children": np.concatenate(children),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "max_depth": max_depth,
+        "n_features": model.n_features_in_,
+    }
+
+def export_forest(model, out_dir):
+    """Write a fitted forest to out_dir; returns its version string"""
+    flat = flatten_forest(model)
+    os.makedirs(out_dir, exist_ok=True)
+    digest = hashlib.sha1()
+    for name in ARRAYS:
+        array = np.ascontiguousarray(flat[name])
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+        digest.update(array.tobytes())
+    meta = {
+        "format": FORMAT_VERSION,
+        "version": f"forest-{digest.hexdigest()[:12]}",
+        "n_trees": len(flat["roots"]),
+        "n_nodes": len(flat["feature"]),
+        "n_features": flat["n_features"],
+        "max_depth": flat["max_depth"],
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta["version"]
+
+def read_meta(model_dir):
+    """meta.json of an exported forest, or None if there isn't one"""
+    path = os.path.join(model_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{model_dir} has forest format {meta.get('format')}, expected {FORMAT_VERSION}")
+    return meta
+
+class CompiledForest:
+    """Pure-NumPy evaluator for a forest written by export_forest()"""
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.version = meta["version"]
+        self.max_depth = meta["max_depth"]
+        self.n_features = meta["n_features"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.classes = arrays["classes"]
+        # Python-level views for single-row walks, where per-call NumPy
+        # overhead would outweigh the work of following one path per tree
+        self._feature_view = memoryview(self.feature)
+        self._threshold_view = memoryview(self.threshold)
+        self._children_view = memoryview(self.children)
+        self._root_list = self.roots.tolist()
+
+    @classmethod
+    def load(cls, model_dir, mmap_mode="r"):
+        meta = read_meta(model_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No exported forest in {model_dir}")
+        # Plain ndarray views of the mapping: np.memmap's subclass hooks
+        # dominate the cost of the small fancy-indexing steps in leaves()
+        arrays = {name: np.load(os.path.join(model_dir, f"{name}.npy"), mmap_mode=mmap_mode).view(np.ndarray)
+                  for name in ARRAYS}
+        return cls(arrays, meta)
+
+    def leaves(self, X):
+        """Leaf node reached in every tree, shape (n_rows, n_trees)"""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected rows of {self.n_features} features, got shape {X.shape}")
+        n_trees = len(self.roots)
+        leaves = np.tile(self.roots, len(X))
+        # Walk every (row, tree) pair down together, dropping pairs from the
+        # active set as they reach a leaf so work follows actual path lengths.
+        active = np.arange(len(leaves))
+        row_offset = np.repeat(np.arange(len(X)) * self.n_features, n_trees)
+        values = X.ravel()
+        node = leaves.copy()
+        while True:
+            feature = self.feature[node]
+            split = feature != LEAF
+            if not split.all():
+                done = ~split
+                leaves[active[done]] = node[done]
+                active, node, feature, row_offset = active[split], node[split], feature[split], row_offset[split]
+                if not len(active):
+                    break
+            went_right = values[row_offset + feature] > self.threshold[node]
+            node = self.children[2 * node + went_right]
+        return leaves.reshape(len(X), n_trees)
+
+    def leaves_one(self, row):
+        """Leaf node reached in every tree for a single row"""
+        if len(row) != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {len(row)}")
+        x = np.asarray(row, dtype=np.float32).tolist()
+        feature, threshold, children = self._feature_view, self._threshold_view, self._children_view
+        leaves = []
+        for node in self._root_list:
+            f = feature[node]
+            while f != LEAF:
+                node = children[2 * node + (x[f] > threshold[node])]
+                f = feature[node]
+            leaves.append(node)
+        return leaves
+
+    def predict_proba(self, X):
+        """Class probabilities, averaged over trees in sklearn's order"""
+        per_tree = self.value[self.leaves(X)]
+        # cumsum adds trees strictly in sequence, like sklearn's accumulation,
+        # so the floating point result (and any argmax tie) is identical.
+        return np.cumsum(per_tree, axis=1)[:, -1] / len(self.roots)
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def predict_one(self, row):
+        """Predicted class for a single row of features"""
+        per_tree = self.value[self.leaves_one(row)]
+        proba = np.cumsum(per_tree, axis=0)[-1] / len(self.roots)
+        return self.classes[np.argmax(proba)]
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(2)
+    import pickle
+    with open(sys.argv[1], "rb") as f:
+        model = pickle.load(f)
+    version = export_forest(model, sys.argv[2])
+    print(f"💾 Exported {len(model.estimators_)} trees to {sys.argv[2]} ({version})")
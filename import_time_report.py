@@ -0,0 +1,54 @@
+"""
+Import-time report for the server module.
+
+Runs `python -X importtime -c "import app_fixed"` in a fresh interpreter,
+prints the slowest imports and fails when the total goes over the budget:
+
+    python import_time_report.py                  # default 0.5s budget
+    python import_time_report.py --budget 0.3 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+def measure(module):
+    """(total_us, [(cumulative_us, self_us, name)]) for importing module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    # The module itself is reported last, with everything it pulled in
+    total = rows[-1][0] if rows else 0
+    return total, rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the AquaSense server")
+    parser.add_argument("--module", default="app_fixed")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    total, rows = measure(args.module)
+    print(f"⏱️ import {args.module}: {total / 1e6:.3f}s (budget {args.budget:.3f}s)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, own, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f}ms {own / 1000:8.1f}ms  {name}")
+
+    if total / 1e6 > args.budget:
+        print("❌ Over import-time budget")
+        return 1
+    print("✅ Within import-time budget")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Idempotent ingest: drop retried or replayed sensor posts before analysis.
+
+Readings are keyed on the device id plus the sequence number (or timestamp)
+the firmware attaches. Keys live in a bounded, time-expiring seen-set; the
+first response for a key is kept so a retry gets the same answer back.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Placeholder for a key whose first delivery is still being processed
+PENDING = object()
+
+def key_part(value):
+    """A JSON scalar as a hashable key component; None for null, lists and objects"""
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return None
+
+def idempotency_key(data, device_id, header_key=None):
+    """Key identifying one reading, or None if the sender gave nothing to key on"""
+    if header_key:
+        return (device_id, "key", header_key)
+    # Malformed ids (e.g. "seq": [1]) are treated as absent: the reading is
+    # still stored, just without duplicate protection
+    seq = key_part(data.get("seq", data.get("sequence")))
+    if seq is not None:
+        # Sequence numbers restart at boot, so the boot id is part of the key
+        return (device_id, "seq", key_part(data.get("boot")), seq)
+    ts = key_part(data.get("ts", data.get("timestamp")))
+    if ts is not None:
+        return (device_id, "ts", ts)
+    return None
+
+class SeenSet:
+    """Bounded set of recently seen keys that expire after `ttl` seconds"""
+
+    def __init__(self, max_entries=100000, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.duplicates = 0
+        # Insertion order is expiry order because every key gets the same ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _purge(self, now):
+        entries = self._entries
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now and len(entries) < self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def claim(self, key, now=None):
+        """Mark key as seen; returns None if new, else what was stored for it"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.duplicates += 1
+                return entry[1]
+            self._entries[key] = (now + self.ttl, PENDING)
+            return None
+
+    def complete(self, key, value):
+        """Store the result of processing a claimed key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], value)
+
+    def release(self, key):
+        """Forget a claimed key so a retry is processed again (e.g. after an error)"""
+        with self._lock:
+            self._entries.pop(key, None)
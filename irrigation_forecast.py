@@ -0,0 +1,208 @@
+"""
+Moisture trend forecasting and fleet-wide irrigation scheduling.
+
+Each device gets a tiny linear model of how fast its soil dries out:
+
+    d(moisture)/dt  ~  b0 + b1 * temperature + b2 * humidity   (% per hour)
+
+The model is fitted incrementally by keeping the normal equations (X'X, X'y)
+per device with exponential forgetting, so an update is O(1) and a
+fleet-wide refit is one batched 3x3 solve in NumPy. Devices report every
+10 s, far too often to see whole-percent moisture move, so each fitted
+interval runs from a per-device anchor reading that only advances once at
+least min_gap_hours have passed.
+"""
+import heapq
+import threading
+import time
+
+import numpy as np
+
+from analysis import MOISTURE_LOW, MOISTURE_BELOW_OPTIMAL
+
+# (threshold, action) pairs matching analyze_water(), most urgent first
+IRRIGATION_THRESHOLDS = (
+    (MOISTURE_LOW, "Immediate irrigation required"),
+    (MOISTURE_BELOW_OPTIMAL, "Light irrigation recommended"),
+)
+
+class MoistureForecaster:
+    """Incremental per-device moisture decay model"""
+
+    def __init__(self, capacity=256, forgetting=0.98, ridge=1e-3,
+                 min_gap_hours=0.25, max_gap_hours=6.0, rise_margin=2.0):
+        self.forgetting = forgetting
+        self.rise_margin = rise_margin
+        self.ridge = ridge
+        self.min_gap_hours = min_gap_hours
+        self.max_gap_hours = max_gap_hours
+        self.index = {}
+        self.devices = []
+        self._lock = threading.Lock()
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        xtx = np.zeros((capacity, 3, 3))
+        xty = np.zeros((capacity, 3))
+        # Last reading per device: epoch seconds, moisture, temperature, humidity
+        last = np.full((capacity, 4), np.nan)
+        # Start of the interval being measured, same layout as last
+        anchor = np.full((capacity, 4), np.nan)
+        n = len(self.devices)
+        if n:
+            xtx[:n] = self.xtx[:n]
+            xty[:n] = self.xty[:n]
+            last[:n] = self.last[:n]
+            anchor[:n] = self.anchor[:n]
+        self.xtx, self.xty, self.last, self.anchor = xtx, xty, last, anchor
+
+    def _row(self, device_id):
+        row = self.index.get(device_id)
+        if row is None:
+            row = len(self.devices)
+            if row == len(self.last):
+                self._alloc(row * 2)
+            self.index[device_id] = row
+            self.devices.append(device_id)
+        return row
+
+    def get_state(self):
+        """Picklable copy of all device models"""
+        with self._lock:
+            n = len(self.devices)
+            return {"devices": list(self.devices), "xtx": self.xtx[:n].copy(),
+                    "xty": self.xty[:n].copy(), "last": self.last[:n].copy(),
+                    "anchor": self.anchor[:n].copy()}
+
+    def set_state(self, state):
+        """Replace all device models with a get_state() copy"""
+        with self._lock:
+            n = len(state["devices"])
+            self.devices = list(state["devices"])
+            self.index = {device_id: row for row, device_id in enumerate(self.devices)}
+            capacity = max(n, 1) * 2
+            self.xtx = np.zeros((capacity, 3, 3))
+            self.xty = np.zeros((capacity, 3))
+            self.last = np.full((capacity, 4), np.nan)
+            self.anchor = np.full((capacity, 4), np.nan)
+            self.xtx[:n] = state["xtx"]
+            self.xty[:n] = state["xty"]
+            self.last[:n] = state["last"]
+            # Snapshots from before anchors existed start measuring from the last reading
+            self.anchor[:n] = state.get("anchor", state["last"])
+
+    def update(self, device_id, ts, moisture, temp, humidity):
+        """Fold one reading into the device's model"""
+        with self._lock:
+            row = self._row(device_id)
+            anchor_ts, anchor_moisture, anchor_temp, anchor_humidity = self.anchor[row]
+            hours = (ts - anchor_ts) / 3600.0
+            self.last[row] = (ts, moisture, temp, humidity)
+            if hours < self.min_gap_hours:
+                # Too soon to see a change; keep measuring from the anchor
+                return
+            # The first reading (no anchor, so hours is NaN) only sets the
+            # anchor. Skip gaps too long to say anything about decay, and
+            # rises of more than sensor noise (irrigation or rain), which
+            # would turn the fitted decay positive and drop the device from
+            # the schedule
+            if hours <= self.max_gap_hours and moisture - anchor_moisture <= self.rise_margin:
+                rate = (moisture - anchor_moisture) / hours
+                x = np.array([1.0, (temp + anchor_temp) / 2, (humidity + anchor_humidity) / 2])
+                self.xtx[row] = self.forgetting * self.xtx[row] + np.outer(x, x)
+                self.xty[row] = self.forgetting * self.xty[row] + rate * x
+            self.anchor[row] = self.last[row]
+
+    def pop_device(self, device_id):
+        """Remove one device's model and return it as plain lists, or None"""
+        with self._lock:
+            row = self.index.pop(device_id, None)
+            if row is None:
+                return None
+            state = {"xtx": self.xtx[row].tolist(), "xty": self.xty[row].tolist(),
+                     "last": self.last[row].tolist(), "anchor": self.anchor[row].tolist()}
+            # Move the last device into the freed row to keep rows contiguous
+            end = len(self.devices) - 1
+            if row != end:
+                moved = self.devices[end]
+                self.devices[row] = moved
+                self.index[moved] = row
+                self.xtx[row] = self.xtx[end]
+                self.xty[row] = self.xty[end]
+                self.last[row] = self.last[end]
+                self.anchor[row] = self.anchor[end]
+            self.devices.pop()
+            self.xtx[end] = 0.0
+            self.xty[end] = 0.0
+            self.last[end] = np.nan
+            self.anchor[end] = np.nan
+            return state
+
+    def merge_device(self, device_id, state):
+        """Fold a pop_device() model into this forecaster"""
+        with self._lock:
+            row = self._row(device_id)
+            # The normal equations are sums, so models built from disjoint
+            # readings of the same device simply add up
+            self.xtx[row] += np.asarray(state["xtx"])
+            self.xty[row] += np.asarray(state["xty"])
+            last = np.asarray(state["last"], dtype=np.float64)
+            if np.isnan(self.last[row, 0]) or last[0] > self.last[row, 0]:
+                self.last[row] = last
+                self.anchor[row] = state.get("anchor", last)
+
+    def _coefficients(self, n):
+        reg = self.ridge * np.eye(3)
+        return np.linalg.solve(self.xtx[:n] + reg, self.xty[:n, :, None])[:, :, 0]
+
+    def forecast(self):
+        """Current moisture, predicted rate and last reading time for every device"""
+        with self._lock:
+            n = len(self.devices)
+            devices = list(self.devices)
+            last = self.last[:n].copy()
+            coef = self._coefficients(n)
+        x = np.column_stack([np.ones(n), last[:, 2], last[:, 3]])
+        rate = np.einsum("ij,ij->i", coef, x)
+        return devices, last[:, 1], rate, last[:, 0]
+
+    def hours_until(self, threshold, moisture, rate):
+        """Hours until moisture drops below threshold (0 if already below, inf if never)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hours = np.where(rate < 0, (moisture - threshold) / -rate, np.inf)
+        return np.where(moisture < threshold, 0.0, hours)
+
+    def schedule(self, now=None, horizon_hours=72.0):
+        """Fleet-wide irrigation schedule ordered by due time, then urgency"""
+        now = time.time() if now is None else now
+        devices, moisture, rate, last_ts = self.forecast()
+        heap = []
+        for priority, (threshold, action) in enumerate(IRRIGATION_THRESHOLDS):
+            # Forecast from the last reading, not from now
+            due = last_ts + self.hours_until(threshold, moisture, rate) * 3600.0
+            due = np.maximum(due, now)
+            rows = np.flatnonzero(due <= now + horizon_hours * 3600.0)
+            heap.extend(zip(due[rows].tolist(), [priority] * len(rows),
+                            [devices[i] for i in rows], [threshold] * len(rows), [action] * len(rows),
+                            moisture[rows].tolist(), rate[rows].tolist()))
+        heapq.heapify(heap)
+
+        schedule = []
+        scheduled = set()
+        while heap:
+            due, priority, device_id, threshold, action, current, device_rate = heapq.heappop(heap)
+            # A device already due for a more urgent action doesn't need a lighter
+            # one queued after it.
+            if device_id in scheduled and priority > 0:
+                continue
+            scheduled.add(device_id)
+            schedule.append({
+                "device_id": device_id,
+                "due": due,
+                "due_in_hours": round((due - now) / 3600.0, 2),
+                "action": action,
+                "threshold": threshold,
+                "moisture": round(current, 2),
+                "rate_per_hour": round(device_rate, 3)
+            })
+        return schedule
@@ -0,0 +1,92 @@
+"""
+Loading of trained model artifacts without the sklearn stack.
+
+The notebook pickles sklearn LabelEncoders (soil_encoder.pkl,
+crop_encoder.pkl); unpickling them needs sklearn and takes a noticeable share
+of startup. Their class lists are exported once to .npy files, which load
+memory-mapped with NumPy alone and are only read when first needed. The
+RandomForest itself is exported by train_model.py to crop_forest/ as flat
+node arrays (see forest_compiler.py).
+
+    python model_store.py export-encoders
+"""
+import json
+import os
+import sys
+import threading
+
+ARTIFACT_DIR = os.environ.get("AQUASENSE_ARTIFACTS", os.path.dirname(os.path.abspath(__file__)))
+
+ENCODERS = {
+    "soil": ("soil_encoder.pkl", "soil_classes.npy"),
+    "crop": ("crop_encoder.pkl", "crop_classes.npy"),
+}
+
+FOREST_DIR = os.path.join(ARTIFACT_DIR, "crop_forest")
+
+_cache = {}
+_lock = threading.Lock()
+
+def export_encoders(artifact_dir=ARTIFACT_DIR):
+    """Convert the pickled LabelEncoders to .npy class arrays (needs sklearn)"""
+    import pickle
+    import numpy as np
+
+    for name, (pickle_name, npy_name) in ENCODERS.items():
+        with open(os.path.join(artifact_dir, pickle_name), "rb") as f:
+            encoder = pickle.load(f)
+        np.save(os.path.join(artifact_dir, npy_name), np.asarray(encoder.classes_, dtype=str))
+        print(f"💾 {pickle_name} -> {npy_name} ({len(encoder.classes_)} classes)")
+
+def load_classes(name, artifact_dir=ARTIFACT_DIR):
+    """Class labels of an encoder ("soil" or "crop"), memory-mapped and cached"""
+    key = ("classes", name, artifact_dir)
+    with _lock:
+        if key not in _cache:
+            import numpy as np
+            path = os.path.join(artifact_dir, ENCODERS[name][1])
+            _cache[key] = np.load(path, mmap_mode="r")
+        return _cache[key]
+
+def encode(name, label, artifact_dir=ARTIFACT_DIR):
+    """LabelEncoder.transform() for a single label; None if unknown"""
+    key = ("index", name, artifact_dir)
+    index = _cache.get(key)
+    if index is None:
+        classes = load_classes(name, artifact_dir)
+        index = _cache[key] = {str(c): i for i, c in enumerate(classes)}
+    return index.get(label)
+
+def decode(name, code, artifact_dir=ARTIFACT_DIR):
+    """LabelEncoder.inverse_transform() for a single code"""
+    return str(load_classes(name, artifact_dir)[int(code)])
+
+def forest_version(model_dir=FOREST_DIR):
+    """Version of the exported forest, or None; reads only its meta.json"""
+    key = ("forest_version", model_dir)
+    if key not in _cache:
+        path = os.path.join(model_dir, "meta.json")
+        version = None
+        if os.path.exists(path):
+            with open(path) as f:
+                version = json.load(f).get("version")
+        _cache[key] = version
+    return _cache[key]
+
+def load_forest(model_dir=FOREST_DIR):
+    """CompiledForest for the exported model (memory-mapped), or None if there isn't one"""
+    if forest_version(model_dir) is None:
+        return None
+    key = ("forest", model_dir)
+    with _lock:
+        if key not in _cache:
+            from forest_compiler import CompiledForest
+            _cache[key] = CompiledForest.load(model_dir)
+        return _cache[key]
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["export-encoders"]:
+        export_encoders()
+    else:
+        print(__doc__)
+        sys.exit(2)
@@ -0,0 +1,232 @@
+"""
+MQTT ingest adapter feeding the same pipeline as HTTP POST /data.
+
+Devices publish their JSON reading to `aquasense/<device_id>/data` with QoS 1.
+The subscriber uses a persistent session (clean_session=False) so readings
+published while the server is down are delivered on reconnect, and it acks
+each message only after the reading has been ingested. Messages are queued by
+the network thread and drained in batches by a worker thread.
+
+MQTT readings skip the per-device rate limit: a reconnect legitimately
+delivers a device's whole backlog at once. Instead, when the server's global
+admission budget is spent, the worker pauses before the next message. Nothing
+is acked while it waits, so the broker stops sending once its in-flight
+window of unacked messages is full.
+
+paho-mqtt is only needed for a real broker; InProcessBroker stands in for
+one in tests and benchmarks.
+"""
+import json
+import queue
+import threading
+
+DEFAULT_TOPIC = "aquasense/+/data"
+
+def device_from_topic(topic):
+    """Device id from an `aquasense/<device_id>/data` topic"""
+    parts = topic.split("/")
+    return parts[1] if len(parts) == 3 else None
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter matching with `+` and `#` wildcards"""
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+def make_paho_client(client_id):
+    """paho-mqtt client with a persistent session and manual QoS 1 acks"""
+    import paho.mqtt.client as mqtt
+    return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id,
+                       clean_session=False, manual_ack=True)
+
+class MQTTIngest:
+    """Subscribe to sensor topics and pass readings to `ingest` in batches"""
+
+    def __init__(self, ingest, host="localhost", port=1883, topic=DEFAULT_TOPIC,
+                 client_id="aquasense-server", batch_size=100, client=None, admission=None,
+                 accept=None):
+        self.ingest = ingest
+        self.admission = admission
+        # Optional device filter, e.g. a cluster shard keeping only its own devices
+        self.accept = accept
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.batch_size = batch_size
+        self.client = client if client is not None else make_paho_client(client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_connect_fail = self._on_connect_fail
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.received = 0
+        self.ingested = 0
+        self.rejected = 0
+        self.skipped = 0
+        # Messages that had to wait for global admission capacity
+        self.paced = 0
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._worker = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            print(f"❌ MQTT broker {self.host}:{self.port} refused the connection ({reason_code}), retrying")
+            return
+        print(f"📶 MQTT connected to {self.host}:{self.port} ({reason_code}), subscribing to {self.topic}")
+        # Re-subscribe on every connect in case the broker dropped the session
+        client.subscribe(self.topic, qos=1)
+
+    def _on_connect_fail(self, client, userdata):
+        print(f"❌ MQTT broker {self.host}:{self.port} unreachable, retrying")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        if not self._stop.is_set():
+            print(f"⚠️ MQTT disconnected from {self.host}:{self.port} ({reason_code}), reconnecting")
+
+    def _on_message(self, client, userdata, message):
+        self.received += 1
+        self._queue.put(message)
+
+    def start(self):
+        """Start the network loop and the draining worker; never blocks on the broker"""
+        # connect_async + loop_start: paho connects (and keeps retrying) in its
+        # own thread, so a broker that is down at boot can't stop HTTP serving
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+        self._worker = threading.Thread(target=self._run, name="mqtt-ingest", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.drain(timeout=0.5)
+
+    def drain(self, timeout=None):
+        """Ingest up to batch_size queued messages; returns how many were handled"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return 0
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for handled, message in enumerate(batch):
+            device_id = device_from_topic(message.topic)
+            if self.accept is not None and not self.accept(device_id or "unknown"):
+                self.skipped += 1
+            elif not self._pace():
+                # Stopping: leave the rest unacked for the broker to redeliver
+                return handled
+            else:
+                self._ingest_message(message, device_id)
+            # Only ack once the reading is stored so an unprocessed message is
+            # redelivered after a crash
+            self.client.ack(message.mid, message.qos)
+        return len(batch)
+
+    def _pace(self):
+        """Wait for a global admission token; False if stopped while waiting"""
+        if self.admission is None:
+            return True
+        wait = self.admission.take_global()
+        if wait:
+            self.paced += 1
+        while wait:
+            if self._stop.wait(min(wait, 1.0)):
+                return False
+            wait = self.admission.take_global()
+        return True
+
+    def stats(self):
+        return {"received": self.received, "ingested": self.ingested, "rejected": self.rejected,
+                "skipped": self.skipped, "paced": self.paced, "queued": self._queue.qsize()}
+
+    def _ingest_message(self, message, device_id):
+        try:
+            data = json.loads(message.payload)
+            _, status = self.ingest(data, device_id, verbose=False)
+        except Exception as e:
+            print(f"❌ MQTT reading on {message.topic} failed: {e}")
+            self.rejected += 1
+            return
+        if status == 200:
+            self.ingested += 1
+        else:
+            self.rejected += 1
+
+class InProcessMessage:
+    def __init__(self, topic, payload, qos, mid):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.mid = mid
+
+class InProcessBroker:
+    """Minimal in-process MQTT broker for tests: topic wildcards and acks only"""
+
+    def __init__(self):
+        self.subscriptions = []
+        self.unacked = {}
+        self._mid = 0
+        self._lock = threading.Lock()
+
+    def client(self):
+        return InProcessClient(self)
+
+    def publish(self, topic, payload, qos=1):
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        for pattern, client in list(self.subscriptions):
+            if topic_matches(pattern, topic):
+                with self._lock:
+                    self._mid += 1
+                    message = InProcessMessage(topic, payload, qos, self._mid)
+                    if qos > 0:
+                        self.unacked[message.mid] = message
+                client.on_message(client, None, message)
+
+class InProcessClient:
+    """The subset of the paho Client API used by MQTTIngest"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+
+    def connect(self, host, port):
+        self.on_connect(self, None, {}, 0)
+
+    def connect_async(self, host, port):
+        self.connect(host, port)
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscriptions.append((topic, self))
+
+    def ack(self, mid, qos):
+        with self.broker._lock:
+            self.broker.unacked.pop(mid, None)
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.broker.subscriptions = [(t, c) for t, c in self.broker.subscriptions if c is not self]
@@ -0,0 +1,126 @@
+"""
+Incremental re-analysis of stored readings when the rules or model change.
+
+Every stored analysis carries the version it was computed with. A
+ReanalysisJob finds the records whose version differs from the current one
+and recomputes only those, in chunks spread over a process pool, while the
+server keeps ingesting new readings.
+
+In the server the job runs over sensor_data_log, which holds the last 100
+records, so it always takes the inline path there; the process pool only
+kicks in for larger record lists (over chunk_size stale records).
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from analysis import analysis_version, analyze_batch
+
+def is_stale(record, version):
+    """True if the record's analysis was not produced by `version`"""
+    analysis = record.get("analysis") or {}
+    return analysis.get("version") != version
+
+def record_inputs(record):
+    """Analysis inputs stored on a record, in analyze_reading() order"""
+    return (
+        record.get("temperature"),
+        record.get("humidity"),
+        record.get("moisture"),
+        record.get("soil_type", "Loamy"),
+        record.get("distance"),
+    )
+
+def analyze_chunk(rows):
+    """Worker entry point: analyze a list of input tuples"""
+    return analyze_batch(rows)
+
+class ReanalysisJob:
+    """Background job that brings stale analyses up to the current version"""
+
+    def __init__(self, records, chunk_size=5000, workers=None, on_change=None):
+        self.records = records
+        self.on_change = on_change
+        self.chunk_size = chunk_size
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._thread = None
+        self._lock = threading.Lock()
+        self._progress = {"state": "idle"}
+
+    def start(self):
+        """Start the job in a background thread; False if already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self.run, name="reanalysis", daemon=True)
+            self._thread.start()
+            return True
+
+    def progress(self):
+        """Snapshot of the job's progress counters"""
+        with self._lock:
+            return dict(self._progress)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._progress.update(fields)
+
+    def _chunks(self, stale):
+        for i in range(0, len(stale), self.chunk_size):
+            yield stale[i:i + self.chunk_size]
+
+    def run(self):
+        """Recompute every stale record; blocks until done"""
+        version = analysis_version()
+        started = time.time()
+        # Copy so ingest can keep appending/evicting while we work
+        stale = [r for r in list(self.records) if is_stale(r, version)]
+        self._update(state="running", version=version, total=len(stale), done=0,
+                     started_at=started, finished_at=None, error=None)
+        print(f"🔁 Re-analysis to {version}: {len(stale)} stale records")
+        try:
+            if self.workers <= 1 or len(stale) <= self.chunk_size:
+                for chunk in self._chunks(stale):
+                    self._apply(chunk, analyze_chunk([record_inputs(r) for r in chunk]))
+            else:
+                self._run_pool(stale)
+        except Exception as e:
+            print(f"❌ Re-analysis failed: {e}")
+            self._update(state="failed", error=str(e), finished_at=time.time())
+            return
+        finished = time.time()
+        self._update(state="done", finished_at=finished)
+        print(f"✅ Re-analysis finished in {finished - started:.2f}s")
+
+    def _run_pool(self, stale):
+        # Keep a bounded number of chunks in flight so memory stays flat
+        # however many records are stale.
+        chunks = self._chunks(stale)
+        max_in_flight = self.workers * 2
+        # spawn, not fork: forking a threaded server could hand a child a
+        # lock (e.g. model_store's) held by another thread
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = {}
+            for chunk in chunks:
+                pending[pool.submit(analyze_chunk, [record_inputs(r) for r in chunk])] = chunk
+                if len(pending) >= max_in_flight:
+                    pending = self._collect(pending, FIRST_COMPLETED)
+            while pending:
+                pending = self._collect(pending, FIRST_COMPLETED)
+
+    def _collect(self, pending, return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            self._apply(pending.pop(future), future.result())
+        return pending
+
+    def _apply(self, chunk, results):
+        for record, analysis in zip(chunk, results):
+            record["analysis"] = analysis
+        if self.on_change is not None:
+            self.on_change()
+        with self._lock:
+            self._progress["done"] += len(chunk)
@@ -0,0 +1,79 @@
+"""
+Generation-based response caching with ETags for read endpoints.
+
+Every successful ingest bumps a generation counter. GET responses are cached
+per (endpoint, query string, generation) in a bounded LRU, so between sensor
+updates a read endpoint is served without re-rendering, and a client that
+sends back the ETag it already has gets an empty 304.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+class ResponseCache:
+    """Bounded LRU of rendered GET responses keyed by data generation"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Invalidate all cached responses; call whenever served data changes"""
+        with self._lock:
+            self.generation += 1
+            # Entries from older generations can never be hit again
+            self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            # Don't keep a response rendered before a concurrent ingest
+            if key[0] != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, view):
+        """Decorator caching a Flask view's GET responses with ETag/304 support"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            key = (self.generation, request.endpoint, tuple(sorted(request.args.items(multi=True))))
+            entry = self.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                entry = (body, response.mimetype, etag)
+                self.put(key, entry)
+            body, mimetype, etag = entry
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            # Clients may keep the body but must revalidate it on every poll
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
@@ -0,0 +1,293 @@
+"""
+Horizontal sharding of devices across several server processes.
+
+Devices are assigned to nodes by a consistent-hash ring with virtual nodes,
+so adding or removing a node only moves the devices on the arcs that changed
+hands. Every node knows the whole ring: a reading posted to the wrong node is
+redirected to its owner, and cluster-wide reads (/logs, the dashboard,
+/schedule) are fanned out to all nodes and merged.
+
+    AQUASENSE_CLUSTER="a=http://127.0.0.1:5001,b=http://127.0.0.1:5002" \\
+    AQUASENSE_NODE=a AQUASENSE_PORT=5001 AQUASENSE_SNAPSHOT=aquasense_snapshot_a.pkl \\
+    AQUASENSE_ARCHIVE_DIR=archive_a python app_fixed.py
+
+Each node needs its own snapshot file and archive directory, or on restart it
+would restore another shard's devices and lose track of its own archived
+files. Without AQUASENSE_SNAPSHOT / AQUASENSE_ARCHIVE_DIR the defaults already
+include the node name (aquasense_snapshot_<node>.pkl, archive_<node>).
+
+    python sharding.py demo --nodes 3
+    python sharding.py rebalance "a=http://...,b=http://..." "a=http://...,b=http://...,c=http://..."
+
+The /cluster endpoints move device state between nodes and are meant for a
+trusted network only, like the rest of the server.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+VNODES = 64
+
+def parse_nodes(spec):
+    """{name: base_url} from "name=url,name=url" """
+    nodes = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, url = part.partition("=")
+        if not sep or not name or not url:
+            raise ValueError(f"Bad cluster node {part!r}; expected name=http://host:port")
+        nodes[name.strip()] = url.strip().rstrip("/")
+    return nodes
+
+def format_nodes(nodes):
+    return ",".join(f"{name}={url}" for name, url in nodes.items())
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class ConsistentHashRing:
+    """Maps keys to node names; membership changes only remap nearby keys"""
+
+    def __init__(self, nodes=(), vnodes=VNODES):
+        self.vnodes = vnodes
+        self.nodes = set()
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add_node(node)
+
+    def _rebuild(self, points):
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add_node(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        points = list(zip(self._points, self._owners))
+        points.extend((ring_hash(f"{node}#{i}"), node) for i in range(self.vnodes))
+        self._rebuild(points)
+
+    def remove_node(self, node):
+        self.nodes.discard(node)
+        self._rebuild([(point, owner) for point, owner in zip(self._points, self._owners)
+                       if owner != node])
+
+    def node_for(self, key):
+        """Owner of key: the first virtual node clockwise from its hash"""
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        i = bisect_right(self._points, ring_hash(key)) % len(self._points)
+        return self._owners[i]
+
+def request_json(url, payload=None, timeout=5.0, headers=None, method=None):
+    """GET (or POST payload as JSON, or another method) and decode the JSON response"""
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    headers = dict(headers or {}, **{"Content-Type": "application/json"})
+    for _ in range(2):
+        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            # urllib won't re-POST on a redirect; readings get a 307 to their owner
+            if e.code in (307, 308) and e.headers.get("Location"):
+                url = urllib.parse.urljoin(url, e.headers["Location"])
+                continue
+            raise
+    raise urllib.error.URLError(f"Too many redirects for {url}")
+
+class Cluster:
+    """This node's view of the cluster: who owns which device, and fan-out reads"""
+
+    def __init__(self, nodes, node, timeout=5.0):
+        if node not in nodes:
+            raise ValueError(f"Node {node!r} is not in the cluster ({', '.join(nodes)})")
+        self.node = node
+        self.timeout = timeout
+        self.set_nodes(nodes)
+
+    def set_nodes(self, nodes):
+        """Switch to a new membership; the caller moves the affected devices"""
+        self.nodes, self.ring = dict(nodes), ConsistentHashRing(nodes)
+
+    def owner(self, device_id):
+        return self.ring.node_for(device_id)
+
+    def owns(self, device_id):
+        return self.owner(device_id) == self.node
+
+    def url_for(self, device_id, path):
+        return self.nodes[self.owner(device_id)] + path
+
+    def fan_out(self, path, local, payload=None, method=None):
+        """{node: response} from every node; local() answers for this node, None if unreachable.
+        With a payload or method it is sent to each node too (for pushing changes)."""
+        def fetch(name):
+            if name == self.node:
+                return local()
+            try:
+                return request_json(self.nodes[name] + path, payload, self.timeout, method=method)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Shard {name} unreachable for {path}: {e}")
+                return None
+
+        names = list(self.nodes)
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            return dict(zip(names, pool.map(fetch, names)))
+
+def cluster_from_env():
+    """Cluster from AQUASENSE_CLUSTER / AQUASENSE_NODE, or None when running alone"""
+    spec = os.environ.get("AQUASENSE_CLUSTER")
+    if not spec:
+        return None
+    return Cluster(parse_nodes(spec), os.environ.get("AQUASENSE_NODE", ""))
+
+def merge_logs(results, keep=None):
+    """Merge per-node /logs responses into one, ordered by reading time"""
+    readings = []
+    total = 0
+    nodes = {}
+    for name, result in results.items():
+        if result is None:
+            nodes[name] = "unreachable"
+            continue
+        nodes[name] = result["total_readings"]
+        total += result["total_readings"]
+        readings.extend(result["all_readings"])
+    readings.sort(key=lambda record: record.get("epoch", 0))
+    if keep is not None:
+        readings = readings[-keep:]
+    return {
+        "total_readings": total,
+        "latest_readings": readings[-10:],
+        "all_readings": readings,
+        "nodes": nodes
+    }
+
+def merge_schedules(results):
+    """Merge per-node /schedule responses into one, ordered by due time"""
+    schedule = []
+    devices = 0
+    nodes = {}
+    for name, result in results.items():
+        if result is None:
+            nodes[name] = "unreachable"
+            continue
+        nodes[name] = result["devices"]
+        devices += result["devices"]
+        schedule.extend(result["schedule"])
+    schedule.sort(key=lambda entry: entry["due"])
+    return {"devices": devices, "schedule": schedule, "nodes": nodes}
+
+def rebalance(old_nodes, new_nodes, timeout=30.0):
+    """Switch every node to new_nodes and move only the devices that changed owner"""
+    everyone = dict(old_nodes, **new_nodes)
+    # New readings go to the new owners from here on
+    for name, url in everyone.items():
+        request_json(url + "/cluster/ring", {"nodes": new_nodes}, timeout)
+
+    new_ring = ConsistentHashRing(new_nodes)
+    moved = 0
+    for name, url in old_nodes.items():
+        devices = request_json(url + "/cluster/devices", timeout=timeout)["devices"]
+        by_owner = {}
+        for device_id in devices:
+            owner = new_ring.node_for(device_id)
+            if owner != name:
+                by_owner.setdefault(owner, []).append(device_id)
+        for owner, device_ids in by_owner.items():
+            state = request_json(url + "/cluster/export", {"devices": device_ids}, timeout)
+            request_json(new_nodes[owner] + "/cluster/import", state, timeout)
+            print(f"🔀 Moved {len(device_ids)} devices {name} -> {owner}")
+            moved += len(device_ids)
+    print(f"✅ Rebalanced: {moved} devices moved, {len(new_nodes)} nodes")
+    return moved
+
+def start_node(name, nodes, port):
+    env = dict(os.environ, AQUASENSE_CLUSTER=format_nodes(nodes), AQUASENSE_NODE=name,
+               AQUASENSE_PORT=str(port), AQUASENSE_DEBUG="0",
+               AQUASENSE_SNAPSHOT=f"aquasense_snapshot_{name}.pkl", AQUASENSE_ARCHIVE_DIR=f"archive_{name}")
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_fixed.py")
+    with open(f"aquasense_node_{name}.log", "w") as log:
+        return subprocess.Popen([sys.executable, app], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for(url, timeout=30.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return request_json(url + "/cluster", timeout=1.0)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+def demo(n_nodes, base_port, devices):
+    """Run a local cluster, post readings through one node, then add a node"""
+    names = [chr(ord("a") + i) for i in range(n_nodes + 1)]
+    urls = {name: f"http://127.0.0.1:{base_port + i}" for i, name in enumerate(names)}
+    nodes = {name: urls[name] for name in names[:n_nodes]}
+    processes = {name: start_node(name, nodes, base_port + i) for i, name in enumerate(names[:n_nodes])}
+    try:
+        for url in nodes.values():
+            wait_for(url)
+        entry = nodes[names[0]]
+        print(f"🌐 {n_nodes} nodes up; posting readings for {devices} devices to {entry}")
+        for i in range(devices * 3):
+            device_id = f"field-{i % devices}"
+            reading = {"device_id": device_id, "temp": 24 + i % 5, "humidity": 60,
+                       "soil_moisture": 30 + i % 20, "distance": 25, "soil_type": "Loamy",
+                       "boot": 1, "seq": i}
+            request_json(entry + "/data", reading, headers={"X-Device-Id": device_id})
+        for name, url in nodes.items():
+            print(f"   {name}: {len(request_json(url + '/cluster/devices')['devices'])} devices")
+        merged = request_json(entry + "/logs")
+        print(f"📋 /logs via {names[0]}: {merged['total_readings']} readings from {merged['nodes']}")
+
+        new_name = names[n_nodes]
+        new_nodes = dict(nodes, **{new_name: urls[new_name]})
+        print(f"➕ Adding node {new_name}")
+        processes[new_name] = start_node(new_name, new_nodes, base_port + n_nodes)
+        wait_for(urls[new_name])
+        rebalance(nodes, new_nodes)
+        for name, url in new_nodes.items():
+            print(f"   {name}: {len(request_json(url + '/cluster/devices')['devices'])} devices")
+        merged = request_json(entry + "/logs")
+        print(f"📋 /logs via {names[0]}: {merged['total_readings']} readings from {merged['nodes']}")
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="AquaSense cluster tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    demo_parser = commands.add_parser("demo", help="run a local multi-process cluster")
+    demo_parser.add_argument("--nodes", type=int, default=3)
+    demo_parser.add_argument("--base-port", type=int, default=5001)
+    demo_parser.add_argument("--devices", type=int, default=30)
+    rebalance_parser = commands.add_parser("rebalance", help="move devices after a membership change")
+    rebalance_parser.add_argument("old")
+    rebalance_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "demo":
+        demo(args.nodes, args.base_port, args.devices)
+    else:
+        rebalance(parse_nodes(args.old), parse_nodes(args.new))
+
+if __name__ == "__main__":
+    main()
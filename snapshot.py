@@ -0,0 +1,38 @@
+"""
+Snapshot of the in-memory reading store for fast warm restarts.
+
+The server pickles its state on shutdown and restores it on boot, so a
+restart doesn't lose the readings (and trend models) collected so far.
+Writes go to a temporary file that is renamed into place, so a crash during
+shutdown never leaves a truncated snapshot behind.
+"""
+import os
+import pickle
+import time
+
+SNAPSHOT_FORMAT = 1
+
+def save_snapshot(path, state):
+    """Atomically write `state` (a dict) to path"""
+    payload = {"format": SNAPSHOT_FORMAT, "saved_at": time.time(), "state": state}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_snapshot(path):
+    """State dict saved by save_snapshot(), or None if missing/unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if payload.get("format") != SNAPSHOT_FORMAT:
+        print(f"⚠️ Ignoring snapshot {path} with unknown format {payload.get('format')}")
+        return None
+    return payload["state"]
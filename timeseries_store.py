@@ -0,0 +1,258 @@
+"""
+Time-indexed reading store with pre-aggregated rollups.
+
+Readings are kept per device in columns sorted by integer epoch seconds, so a
+time range is found with two binary searches. Minute, hour and day rollups
+(count/sum/min/max per field) are updated on ingest, and a range aggregate is
+answered from the coarsest buckets that fit inside the range, with raw
+readings only for the partial minutes at either end.
+
+A reading may leave out a field (e.g. distance without the ultrasonic
+sensor). It is stored as NaN, left out of rollups and aggregates, and
+returned as None.
+
+Readings can be moved out to a cold tier (archive.ColumnArchive); queries
+then combine both transparently.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+FIELDS = ("temperature", "humidity", "moisture", "distance")
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+# Coarsest first: the query planner tries these in order
+TIERS = (DAY, HOUR, MINUTE)
+TIER_NAMES = {DAY: "day", HOUR: "hour", MINUTE: "minute"}
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": DAY, "w": 7 * DAY}
+
+# Column value of a field the reading didn't have
+MISSING = float("nan")
+
+def is_missing(value):
+    return value is None or value != value
+
+def finite_float(value):
+    """float(value), rejecting inf and nan (which int() can't take)"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{value!r} is not a finite number")
+    return number
+
+def parse_duration(value):
+    """Whole seconds from a duration such as 90, "30m", "24h", "7d" or "2w" """
+    text = str(value).strip()
+    unit = DURATION_UNITS.get(text[-1:].lower())
+    if unit is None:
+        return int(finite_float(text))
+    return int(finite_float(finite_float(text[:-1]) * unit))
+
+class DeviceSeries:
+    """Sorted columns and rollup buckets for one device"""
+
+    def __init__(self):
+        self.ts = array("q")
+        self.columns = {field: array("d") for field in FIELDS}
+        self.soil_type = []
+        # tier seconds -> field -> bucket start -> [count, sum, min, max]
+        self.rollups = {tier: {field: {} for field in FIELDS} for tier in TIERS}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts, values, soil_type):
+        values = {field: MISSING if is_missing(values.get(field)) else values[field] for field in FIELDS}
+        if not self.ts or ts >= self.ts[-1]:
+            i = len(self.ts)
+            self.ts.append(ts)
+            for field in FIELDS:
+                self.columns[field].append(values[field])
+            self.soil_type.append(soil_type)
+        else:
+            # Late reading: keep the columns sorted
+            i = bisect_right(self.ts, ts)
+            self.ts.insert(i, ts)
+            for field in FIELDS:
+                self.columns[field].insert(i, values[field])
+            self.soil_type.insert(i, soil_type)
+
+        for tier in TIERS:
+            bucket = ts - ts % tier
+            for field in FIELDS:
+                value = values[field]
+                if value != value:
+                    continue
+                stats = self.rollups[tier][field].get(bucket)
+                if stats is None:
+                    self.rollups[tier][field][bucket] = [1, value, value, value]
+                else:
+                    stats[0] += 1
+                    stats[1] += value
+                    if value < stats[2]:
+                        stats[2] = value
+                    if value > stats[3]:
+                        stats[3] = value
+
+    def bounds(self, start, end):
+        """Index range of readings with start <= ts < end"""
+        return bisect_left(self.ts, start), bisect_left(self.ts, end)
+
+    def drop_before(self, cutoff):
+        """Remove readings and rollup buckets before cutoff (a DAY multiple)"""
+        n = bisect_left(self.ts, cutoff)
+        del self.ts[:n]
+        for field in FIELDS:
+            del self.columns[field][:n]
+        del self.soil_type[:n]
+        for tier in TIERS:
+            for buckets in self.rollups[tier].values():
+                for bucket in [b for b in buckets if b < cutoff]:
+                    del buckets[bucket]
+
+    def rows(self, start, end):
+        lo, hi = self.bounds(start, end)
+        return [
+            dict({field: None if is_missing(self.columns[field][i]) else self.columns[field][i]
+                  for field in FIELDS},
+                 ts=self.ts[i], soil_type=self.soil_type[i])
+            for i in range(lo, hi)
+        ]
+
+def plan_range(start, end):
+    """Split [start, end) into ("raw", lo, hi) and (tier, bucket) segments"""
+    segments = []
+    pos = start
+    while pos < end:
+        for tier in TIERS:
+            if pos % tier == 0 and pos + tier <= end:
+                segments.append((tier, pos))
+                pos += tier
+                break
+        else:
+            # Not on a usable boundary: raw readings up to the next minute
+            next_pos = min(end, pos - pos % MINUTE + MINUTE)
+            segments.append(("raw", pos, next_pos))
+            pos = next_pos
+    return segments
+
+def merge_stats(total, count, value_sum, low, high):
+    if count == 0:
+        return
+    total["count"] += count
+    total["sum"] += value_sum
+    total["min"] = low if total["min"] is None else min(total["min"], low)
+    total["max"] = high if total["max"] is None else max(total["max"], high)
+
+class TimeSeriesStore:
+    """Per-device sorted readings and rollups, safe to share between threads"""
+
+    def __init__(self, archive=None):
+        self.series = {}
+        # Optional cold tier holding readings compacted out of memory
+        self.archive = archive
+        self._lock = threading.Lock()
+
+    def append(self, device_id, ts, values, soil_type):
+        """Store one reading; values maps names in FIELDS to floats (absent or None: missing)"""
+        with self._lock:
+            series = self.series.get(device_id)
+            if series is None:
+                series = self.series[device_id] = DeviceSeries()
+            series.append(int(ts), values, soil_type)
+
+    def pop_device(self, device_id):
+        """Remove a device and return all its raw readings, archived ones included"""
+        with self._lock:
+            series = self.series.pop(device_id, None)
+            rows = series.rows(series.ts[0], series.ts[-1] + 1) if series is not None and len(series) else []
+        if self.archive is not None:
+            rows = self.archive.pop_device(device_id) + rows
+        return rows
+
+    def columns_before(self, device_id, cutoff):
+        """Copies of a device's (ts, columns, soil types) before cutoff, for archiving"""
+        with self._lock:
+            series = self.series.get(device_id)
+            if series is None:
+                return [], {field: [] for field in FIELDS}, []
+            n = bisect_left(series.ts, cutoff)
+            return (series.ts[:n].tolist(), {field: series.columns[field][:n].tolist() for field in FIELDS},
+                    series.soil_type[:n])
+
+    def drop_before(self, device_id, cutoff, expected, then):
+        """Drop a device's readings before cutoff and call then(), atomically for readers.
+        False (nothing dropped) if the number of such readings is no longer expected."""
+        with self._lock:
+            series = self.series.get(device_id)
+            if series is None or bisect_left(series.ts, cutoff) != expected:
+                return False
+            then()
+            series.drop_before(cutoff)
+            return True
+
+    def import_readings(self, device_id, rows):
+        """Append readings returned by pop_device(), rebuilding their rollups"""
+        with self._lock:
+            series = self.series.get(device_id)
+            if series is None:
+                series = self.series[device_id] = DeviceSeries()
+            for row in rows:
+                series.append(int(row["ts"]), row, row["soil_type"])
+
+    def devices(self):
+        with self._lock:
+            devices = set(self.series)
+        if self.archive is not None:
+            devices.update(self.archive.devices())
+        return sorted(devices)
+
+    def readings(self, device_id, start, end):
+        """Raw readings of a device with start <= ts < end"""
+        with self._lock:
+            series = self.series.get(device_id)
+            rows = series.rows(start, end) if series is not None else []
+            archived = self.archive.files(device_id, start, end)[0] if self.archive is not None else []
+        if archived:
+            # Archived files are immutable, so they can be read outside the lock
+            rows = sorted(self.archive.readings(archived, start, end) + rows, key=lambda row: row["ts"])
+        return rows
+
+    def aggregate(self, device_id, field, start, end):
+        """count/sum/min/max/avg of a field over [start, end)"""
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field {field!r}; expected one of {', '.join(FIELDS)}")
+        total = {"count": 0, "sum": 0.0, "min": None, "max": None}
+        used = {"raw": 0, "minute": 0, "hour": 0, "day": 0}
+        archived = []
+        with self._lock:
+            if self.archive is not None:
+                archived, used["archive_pruned"] = self.archive.files(device_id, start, end)
+                used["archive_stats"] = used["archive_files"] = 0
+            series = self.series.get(device_id)
+            if series is not None and len(series):
+                column = series.columns[field]
+                # Nothing in memory lies outside the first..last reading (older
+                # ones are archived), and clamping keeps the plan's length tied
+                # to stored data rather than to whatever range was asked for
+                for segment in plan_range(max(start, series.ts[0]), min(end, series.ts[-1] + 1)):
+                    if segment[0] == "raw":
+                        lo, hi = series.bounds(segment[1], segment[2])
+                        values = [value for value in column[lo:hi] if value == value]
+                        if values:
+                            merge_stats(total, len(values), sum(values), min(values), max(values))
+                        used["raw"] += hi - lo
+                    else:
+                        tier, bucket = segment
+                        stats = series.rollups[tier][field].get(bucket)
+                        if stats is not None:
+                            merge_stats(total, *stats)
+                        used[TIER_NAMES[tier]] += 1
+        if archived:
+            self.archive.aggregate(archived, field, start, end, total, used)
+        total["avg"] = total["sum"] / total["count"] if total["count"] else None
+        total["segments"] = used
+        return total
@@ -0,0 +1,60 @@
+"""
+Train the crop RandomForest from soil.ipynb and export it for the server.
+
+Same features, split and classifier as the notebook; labels are encoded with
+the exported encoder classes (soil_classes.npy / crop_classes.npy) so codes
+match what the server uses. The fitted forest is flattened into
+crop_forest/ and checked against sklearn's own predictions.
+
+    python train_model.py [--trees 100] [--out crop_forest]
+
+Needs pandas and scikit-learn; the server only needs NumPy to use the result.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+import model_store
+from forest_compiler import CompiledForest, export_forest
+
+FEATURES = ['Temparature', 'Humidity', 'Moisture', 'Soil Type']
+
+def load_dataset(path):
+    df = pd.read_csv(path)
+    df = df.dropna(subset=FEATURES + ['Crop Type'])
+    X = df[FEATURES].copy()
+    X['Soil Type'] = [model_store.encode("soil", s) for s in X['Soil Type']]
+    y = np.array([model_store.encode("crop", c) for c in df['Crop Type']])
+    return X.to_numpy(dtype=np.float64), y
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export the crop RandomForest")
+    parser.add_argument("--data", default="data_core.csv")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--out", default=model_store.FOREST_DIR)
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestClassifier(n_estimators=args.trees, random_state=42)
+    model.fit(X_train, y_train)
+    print(f"🎯 Test accuracy: {model.score(X_test, y_test):.3f}")
+
+    version = export_forest(model, args.out)
+    forest = CompiledForest.load(args.out)
+    if not np.array_equal(forest.predict(X_test), model.predict(X_test)):
+        raise SystemExit("❌ Compiled forest disagrees with sklearn")
+
+    started = time.perf_counter()
+    for row in X_test[:200]:
+        forest.predict_one(row)
+    per_row = (time.perf_counter() - started) / 200
+    print(f"💾 Exported {forest.meta['n_trees']} trees / {forest.meta['n_nodes']} nodes "
+          f"to {args.out} ({version}), {per_row * 1e6:.0f}us per single-row prediction")
+
+if __name__ == "__main__":
+    main()
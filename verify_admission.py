@@ -0,0 +1,154 @@
+"""
+Check admission control: per-device vs global shedding, refunds, MQTT pacing.
+
+Drives AdmissionController with explicit clock values:
+
+- a device past its burst is shed as device_rate_limited without using up
+  global capacity, other devices are unaffected, and its bucket refills
+- an empty global bucket sheds as global_overload and gives the device its
+  token back
+- header-less readings take only the global token up front; admit_device()
+  charges the device once its id is known and refunds the global token
+- a near-duplicate shed under overload returns its global token, and only
+  happens under overload
+- take_global() paces without counting a shed
+- an MQTT backlog from one device is ingested in full and fully acked
+
+    python verify_admission.py
+
+Needs Flask (for the MQTT part).
+"""
+import contextlib
+import io
+import sys
+import time
+
+from admission import AdmissionController
+
+def values(moisture):
+    return {"temperature": 25.0, "humidity": 50.0, "moisture": moisture, "distance": 30.0}
+
+def check_device_and_global():
+    failures = []
+    # The global bucket barely refills, so its count is easy to follow
+    ctrl = AdmissionController(device_rate=0.5, device_burst=5, global_rate=0.001, global_burst=20)
+    now = ctrl.global_bucket.updated
+    results = [ctrl.admit("a", now) for _ in range(7)]
+    if [r[0] for r in results] != [True] * 5 + [False] * 2 or results[-1][1] != "device_rate_limited":
+        failures.append(f"device burst of 5 gave {[r[:2] for r in results]}")
+    elif not 0 < results[-1][2] <= 2.0:
+        failures.append(f"retry_after {results[-1][2]} for a 0.5/s bucket")
+    if int(ctrl.global_bucket.tokens) != 15:
+        failures.append(f"rate-limited readings used global tokens ({ctrl.global_bucket.tokens} left, expected 15)")
+    if not ctrl.admit("b", now)[0]:
+        failures.append("another device was shed because of the first")
+    if not ctrl.admit("a", now + 2.0)[0]:
+        failures.append("device bucket didn't refill after 2 s")
+
+    i = 0
+    while ctrl.global_bucket.tokens >= 1:
+        ctrl.admit(f"dev{i}", now + 2.0)
+        i += 1
+    admitted, reason, _ = ctrl.admit("c", now + 2.0)
+    if admitted or reason != "global_overload":
+        failures.append(f"empty global bucket gave {admitted, reason}")
+    elif ctrl._buckets["c"].tokens != 5:
+        failures.append("a global_overload shed kept the device's token")
+    if ctrl.shed != {"device_rate_limited": 2, "global_overload": 1}:
+        failures.append(f"shed counters {dict(ctrl.shed)}")
+    return failures
+
+def check_header_less():
+    failures = []
+    ctrl = AdmissionController(device_rate=0.01, device_burst=2, global_rate=10, global_burst=20)
+    now = ctrl.global_bucket.updated
+    for i in range(10):
+        # Ten devices behind one gateway address
+        if not (ctrl.admit(None, now)[0] and ctrl.admit_device(f"gw-{i}", now)[0]):
+            failures.append(f"header-less device gw-{i} was shed")
+    tokens = ctrl.global_bucket.tokens
+    for _ in range(2):
+        # gw-0's second reading fits its burst of 2, the third doesn't
+        ctrl.admit(None, now)
+        admitted, reason, _ = ctrl.admit_device("gw-0", now)
+    if admitted or reason != "device_rate_limited":
+        failures.append(f"third reading of gw-0 gave {admitted, reason}")
+    if ctrl.global_bucket.tokens != tokens - 1:
+        failures.append("admit_device didn't refund the global token of a shed reading")
+    if ctrl.admitted != 11:
+        failures.append(f"admitted counter {ctrl.admitted}, expected 11")
+    for _ in range(30):
+        ctrl.refund_global()
+    if ctrl.global_bucket.tokens != 20:
+        failures.append(f"refunds overfilled the global bucket to {ctrl.global_bucket.tokens}")
+    return failures
+
+def check_near_duplicates():
+    failures = []
+    ctrl = AdmissionController(device_rate=100, device_burst=100, global_rate=0.001, global_burst=8)
+    now = ctrl.global_bucket.updated
+    ctrl.admit("d", now)
+    if ctrl.shed_near_duplicate("d", values(40.0), now):
+        failures.append("first reading was shed")
+    ctrl.admit("d", now)
+    if ctrl.shed_near_duplicate("d", values(40.2), now):
+        failures.append("near-duplicate shed while not overloaded")
+    for _ in range(5):
+        ctrl.admit("d", now)
+    tokens = ctrl.global_bucket.tokens
+    if not ctrl.shed_near_duplicate("d", values(40.1), now):
+        failures.append("near-duplicate not shed under overload")
+    elif ctrl.global_bucket.tokens != tokens + 1:
+        failures.append("near-duplicate shed kept its global token")
+    if ctrl.shed_near_duplicate("d", values(45.0), now):
+        failures.append("a reading with new information was shed")
+    return failures
+
+def check_pacing():
+    failures = []
+    ctrl = AdmissionController(global_rate=10, global_burst=2)
+    now = ctrl.global_bucket.updated
+    waits = [ctrl.take_global(now) for _ in range(3)]
+    if waits[:2] != [0.0, 0.0] or not 0 < waits[2] <= 0.1:
+        failures.append(f"take_global waits {waits}")
+    if ctrl.shed:
+        failures.append(f"pacing counted sheds {dict(ctrl.shed)}")
+    return failures
+
+def check_mqtt_backlog():
+    import app_fixed
+    from mqtt_ingest import InProcessBroker, MQTTIngest
+
+    ctrl = AdmissionController(global_rate=50, global_burst=5)
+    app_fixed.admission = ctrl
+    broker = InProcessBroker()
+    ingest = MQTTIngest(app_fixed.ingest_reading, client=broker.client(), admission=ctrl)
+    boot = int(time.time())
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest.start()
+        # Readings queued while the server was down arrive in one burst
+        for seq in range(30):
+            broker.publish("aquasense/backlog/data", {"soil_moisture": 40 + seq % 5, "seq": seq, "boot": boot})
+        deadline = time.time() + 10
+        while ingest.ingested + ingest.rejected < 30 and time.time() < deadline:
+            time.sleep(0.01)
+        ingest.stop()
+    failures = []
+    if ingest.ingested != 30 or broker.unacked:
+        failures.append(f"ingested {ingest.ingested}, rejected {ingest.rejected}, unacked {len(broker.unacked)}")
+    if not ingest.paced:
+        failures.append("backlog beyond the global burst wasn't paced")
+    return failures
+
+def main():
+    failures = []
+    for name, check in (("per-device vs global", check_device_and_global), ("header-less", check_header_less),
+                        ("near-duplicates", check_near_duplicates), ("pacing", check_pacing),
+                        ("MQTT backlog", check_mqtt_backlog)):
+        found = check()
+        print(f"{'✅' if not found else '❌'} {name}: {'; '.join(found) or 'ok'}")
+        failures.extend(found)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
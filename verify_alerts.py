@@ -0,0 +1,109 @@
+"""
+Check alert rule evaluation: hold, cooldown and resolve transitions.
+
+Feeds readings with explicit timestamps through an AlertEngine:
+
+- "moisture < 20 for 30m" fires only once the condition has held for 30
+  minutes, stays quiet while it keeps holding, and resolves when it clears
+- a cooldown holds back re-firing until it has passed since the last alert
+- a condition that clears before firing resolves silently
+- device-scoped rules ignore other devices; aliases such as temp work, and a
+  reading without the rule's field doesn't touch it
+- malformed rules are rejected, and saved rules load back, replacing the
+  configured ones
+
+    python verify_alerts.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+from alert_rules import AlertEngine, Rule, RuleError, alert_engine_from_env
+
+def check_transitions():
+    engine = AlertEngine()
+    engine.add_rule(Rule("dry", "moisture < 20 for 30m", cooldown="1h"))
+    steps = [
+        (0, 10, []),                 # condition starts holding
+        (1200, 15, []),              # 20 minutes in
+        (1800, 15, ["firing"]),      # 30 minutes: fire
+        (1900, 12, []),              # still holding: no repeat
+        (2000, 25, ["resolved"]),    # cleared
+        (2100, 10, []),              # holding again
+        (3900, 10, []),              # held 30m, but only 35m since the last alert
+        (5400, 10, ["firing"]),      # cooldown over
+        (6000, 30, ["resolved"]),
+        (7000, 10, []),
+        (7100, 30, []),              # never fired, so nothing to resolve
+    ]
+    failures = []
+    for ts, moisture, expected in steps:
+        got = [event["state"] for event in engine.evaluate("d1", ts, {"moisture": moisture})]
+        if got != expected:
+            failures.append(f"t={ts} moisture={moisture}: {got}, expected {expected}")
+    engine.evaluate("d1", 8000, {"moisture": 5})
+    engine.evaluate("d1", 9800, {"moisture": 5})
+    if [(f["rule"], f["device_id"], f["since"]) for f in engine.firing()] != [("dry", "d1", 8000)]:
+        failures.append(f"firing() gave {engine.firing()}")
+    return failures
+
+def check_scoping():
+    engine = AlertEngine()
+    engine.add_rule(Rule("hot", "temp > 35", device="d1"))
+    engine.add_rule(Rule("deep", "water_table > 50"))
+    failures = []
+    if engine.evaluate("d2", 0, {"temperature": 40}):
+        failures.append("a rule scoped to d1 fired for d2")
+    if [e["rule"] for e in engine.evaluate("d1", 0, {"temperature": 40})] != ["hot"]:
+        failures.append("temp alias rule didn't fire immediately for d1")
+    if engine.evaluate("d3", 0, {"moisture": 10}):
+        failures.append("a reading without distance triggered a distance rule")
+    if [e["rule"] for e in engine.evaluate("d3", 0, {"distance": 60})] != ["deep"]:
+        failures.append("fleet-wide water_table rule didn't fire")
+    if not engine.remove_rule("hot") or engine.remove_rule("hot"):
+        failures.append("remove_rule should succeed once")
+    return failures
+
+def check_rules_and_state():
+    failures = []
+    for bad in ["moisture <", "ph < 5", "moisture < 5 for 3y", ["x"]]:
+        try:
+            Rule("x", bad)
+            failures.append(f"rule {bad!r} was accepted")
+        except RuleError:
+            pass
+    for spec in (["x"], {"when": "moisture < 1"}, {"name": "x", "when": "moisture < 1", "cooldown": "inf"}):
+        try:
+            Rule.from_dict(spec)
+            failures.append(f"spec {spec!r} was accepted")
+        except RuleError:
+            pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        state = os.path.join(directory, "rules.json")
+        engine = AlertEngine(state_path=state)
+        engine.add_rule(Rule("weekly", "moisture < 5 for 1w", cooldown="2w"))
+        engine.save()
+        engine.save()
+        reloaded = alert_engine_from_env(state)
+        rule = reloaded.rules.get("weekly")
+        if sorted(reloaded.rules) != ["weekly"] or (rule.hold_seconds, rule.cooldown) != (604800, 1209600):
+            failures.append(f"saved rules reloaded as {[r.to_dict() for r in reloaded.rules.values()]}")
+        if os.listdir(directory) != ["rules.json"]:
+            failures.append(f"save left {os.listdir(directory)}")
+    return failures
+
+def main():
+    failures = []
+    for name, check in (("hold/cooldown/resolve", check_transitions), ("scoping", check_scoping),
+                        ("rules and state file", check_rules_and_state)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            found = check()
+        print(f"{'✅' if not found else '❌'} {name}: {'; '.join(found) or 'ok'}")
+        failures.extend(found)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Check that archiving readings doesn't change any query answer.
+
+Fills two TimeSeriesStores with the same random readings, compacts one of
+them into a ColumnArchive in a temporary directory, and compares both over
+random time ranges:
+
+- readings() must return the same rows
+- aggregate() must give the same count/min/max and sum (to float rounding)
+  for every field, including one a device never reports
+
+Also reopens the archive from its manifest and checks it still answers.
+
+    python verify_archive.py [--ranges 300] [--days 20] [--seed 1]
+
+Needs NumPy.
+"""
+import argparse
+import contextlib
+import io
+import math
+import random
+import sys
+import tempfile
+
+from archive import ColumnArchive, CompactionJob
+from timeseries_store import DAY, FIELDS, TimeSeriesStore
+
+# Awkward ids on purpose: they become directory names in the archive
+DEVICES = ("AA:BB:01", "b", "c/../x")
+# Reports no distance, like a device without the ultrasonic sensor
+NO_DISTANCE = "b"
+START = 1_700_000_000
+
+def fill(stores, days, rng):
+    """Same random readings, 5 s to 10 min apart, into every store"""
+    for device_id in DEVICES:
+        ts = START
+        while ts < START + days * DAY:
+            values = {field: round(rng.uniform(-1, 100), 2) for field in FIELDS}
+            if device_id == NO_DISTANCE:
+                del values["distance"]
+            soil_type = rng.choice(["Sandy", "Loamy", "Clay"])
+            for store in stores:
+                store.append(device_id, ts, values, soil_type)
+            ts += rng.randint(5, 600)
+
+def compare(hot, tiered, ranges, days, rng):
+    """List of mismatch descriptions between the two stores (empty if none)"""
+    failures = []
+    for _ in range(ranges):
+        device_id = rng.choice(DEVICES)
+        start = rng.randint(START - DAY, START + (days + 1) * DAY)
+        end = rng.randint(start, START + (days + 1) * DAY)
+        if hot.readings(device_id, start, end) != tiered.readings(device_id, start, end):
+            failures.append(f"readings differ for {device_id} [{start}, {end})")
+        for field in FIELDS:
+            expected = hot.aggregate(device_id, field, start, end)
+            got = tiered.aggregate(device_id, field, start, end)
+            if (got["count"], got["min"], got["max"]) != (expected["count"], expected["min"], expected["max"]) \
+                    or not math.isclose(got["sum"], expected["sum"], rel_tol=1e-9, abs_tol=1e-6):
+                failures.append(f"{field} aggregate differs for {device_id} [{start}, {end})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare archived and in-memory query answers")
+    parser.add_argument("--ranges", type=int, default=300, help="random time ranges to compare")
+    parser.add_argument("--days", type=int, default=20, help="days of readings per device")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        hot = TimeSeriesStore()
+        tiered = TimeSeriesStore(archive=ColumnArchive(directory))
+        fill((hot, tiered), args.days, rng)
+        job = CompactionJob(tiered, tiered.archive, after_seconds=7 * DAY)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = job.run_once(now=START + args.days * DAY)
+        print(f"🗄️ Archived {result['rows']} readings into {result['files']} files")
+        if not result["rows"]:
+            print("❌ Nothing was archived; use more --days")
+            return 1
+
+        failures = compare(hot, tiered, args.ranges, args.days, rng)
+        reopened = TimeSeriesStore(archive=ColumnArchive(directory))
+        for device_id in DEVICES:
+            if reopened.readings(device_id, 0, result["cutoff"]) != hot.readings(device_id, 0, result["cutoff"]):
+                failures.append(f"reopened archive differs for {device_id}")
+    for failure in failures[:10]:
+        print(f"   {failure}")
+    print(f"{'✅' if not failures else '❌'} {args.ranges} ranges: {len(failures) or 'no'} mismatches")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Check the generation-based response cache and its ETag/304 handling.
+
+- a repeated GET is served from the cache without running the view again
+- sending back the ETag gives an empty 304 while nothing was ingested
+- after a bump (an ingest) the same ETag gets a fresh 200 body
+- query strings are cached separately, errors are never cached, a response
+  rendered before a concurrent bump isn't stored, and the LRU stays bounded
+- the same through the server: polling /logs gets 304s until POST /data
+
+    python verify_cache.py
+
+Needs Flask.
+"""
+import contextlib
+import io
+import sys
+
+from flask import Flask, jsonify, request
+
+from response_cache import ResponseCache
+
+def check_cache():
+    failures = []
+    cache = ResponseCache(max_entries=2)
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/view')
+    @cache.cached
+    def view():
+        calls.append(request.args.get("q"))
+        if request.args.get("q") == "fail":
+            return jsonify({"error": "nope"}), 500
+        return jsonify({"q": request.args.get("q"), "generation": cache.generation})
+
+    client = app.test_client()
+    first = client.get("/view")
+    etag = first.headers.get("ETag", "").strip('"')
+    again = client.get("/view")
+    if len(calls) != 1 or again.data != first.data:
+        failures.append(f"repeat GET ran the view {len(calls)} times")
+    revalidated = client.get("/view", headers={"If-None-Match": f'"{etag}"'})
+    if revalidated.status_code != 304 or revalidated.data:
+        failures.append(f"matching ETag gave {revalidated.status_code} with {len(revalidated.data)} bytes")
+
+    cache.bump()
+    fresh = client.get("/view", headers={"If-None-Match": f'"{etag}"'})
+    if fresh.status_code != 200 or fresh.get_json()["generation"] != 1:
+        failures.append(f"after a bump the old ETag gave {fresh.status_code} {fresh.data!r}")
+
+    client.get("/view?q=a")
+    if calls[-1] != "a":
+        failures.append("a different query string was served from another entry")
+    client.get("/view?q=fail")
+    client.get("/view?q=fail")
+    if calls.count("fail") != 2:
+        failures.append("an error response was cached")
+
+    key = (cache.generation - 1, "view", ())
+    cache.put(key, (b"stale", "application/json", "x"))
+    if cache.get(key) is not None:
+        failures.append("a response from an older generation was stored")
+    for q in "bcd":
+        client.get(f"/view?q={q}")
+    if len(cache._entries) > 2:
+        failures.append(f"cache holds {len(cache._entries)} entries, bound is 2")
+    return failures
+
+def check_server():
+    import app_fixed
+    from admission import AdmissionController
+
+    unlimited = float("inf")
+    app_fixed.admission = AdmissionController(unlimited, unlimited, unlimited, unlimited)
+    client = app_fixed.app.test_client()
+    failures = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = client.get("/logs?scope=local")
+        etag = first.headers.get("ETag", "")
+        polls = [client.get("/logs?scope=local", headers={"If-None-Match": etag}).status_code for _ in range(5)]
+        client.post("/data", json={"device_id": "verify-cache", "soil_moisture": 41, "seq": 1})
+        after = client.get("/logs?scope=local", headers={"If-None-Match": etag})
+    if polls != [304] * 5:
+        failures.append(f"polling without ingest gave {polls}")
+    if after.status_code != 200 or b"verify-cache" not in after.data:
+        failures.append(f"after POST /data the old ETag gave {after.status_code} without the new reading")
+    return failures
+
+def main():
+    failures = []
+    for name, check in (("ResponseCache", check_cache), ("/logs", check_server)):
+        found = check()
+        print(f"{'✅' if not found else '❌'} {name}: {'; '.join(found) or 'ok'}")
+        failures.extend(found)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
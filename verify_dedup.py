@@ -0,0 +1,101 @@
+"""
+Check idempotent ingest: retried readings are dropped, odd ids never crash.
+
+- idempotency_key() on header keys, seq/boot, timestamps and unkeyed readings,
+  including non-scalar ids such as "seq": [1] (treated as unkeyed)
+- SeenSet: a repeat returns the first result, PENDING while in progress,
+  release() allows a retry, keys expire after ttl and the set stays bounded
+- POST /data end to end: a retried reading is stored once, and malformed
+  ids are stored rather than failing
+
+    python verify_dedup.py
+
+Needs Flask (for the /data part).
+"""
+import contextlib
+import io
+import sys
+
+from ingest_dedup import PENDING, SeenSet, idempotency_key
+
+def check_keys():
+    failures = []
+    cases = [
+        (({}, "d", "abc"), ("d", "key", "abc")),
+        (({"seq": 5, "boot": 9}, "d"), ("d", "seq", "9", "5")),
+        (({"sequence": 5}, "d"), ("d", "seq", None, "5")),
+        (({"ts": 1700000000}, "d"), ("d", "ts", "1700000000")),
+        (({"temp": 20}, "d"), None),
+        (({"seq": [1]}, "d"), None),
+        (({"seq": {"n": 1}, "ts": 3}, "d"), ("d", "ts", "3")),
+        (({"seq": 5, "boot": [1]}, "d"), ("d", "seq", None, "5")),
+    ]
+    for args, expected in cases:
+        try:
+            got = idempotency_key(*args)
+            hash(got)
+        except Exception as e:
+            failures.append(f"idempotency_key{args} raised {e!r}")
+            continue
+        if got != expected:
+            failures.append(f"idempotency_key{args} = {got!r}, expected {expected!r}")
+    if idempotency_key({"seq": "7"}, "d") != idempotency_key({"seq": 7}, "d"):
+        failures.append("seq 7 and \"7\" should be the same reading")
+    return failures
+
+def check_seen_set():
+    failures = []
+    seen = SeenSet(max_entries=3, ttl=10.0)
+    if seen.claim("a", now=0) is not None:
+        failures.append("first claim should be new")
+    if seen.claim("a", now=1) is not PENDING:
+        failures.append("repeat while in progress should be PENDING")
+    seen.complete("a", "first answer")
+    if seen.claim("a", now=2) != "first answer":
+        failures.append("repeat should get the first result")
+    seen.release("a")
+    if seen.claim("a", now=3) is not None:
+        failures.append("released key should be processed again")
+    if seen.claim("a", now=14) is not None:
+        failures.append("key should expire after ttl")
+    for key in "bcde":
+        seen.claim(key, now=15)
+    if len(seen) > 3:
+        failures.append(f"seen-set grew to {len(seen)} entries, bound is 3")
+    if seen.duplicates != 2:
+        failures.append(f"counted {seen.duplicates} duplicates, expected 2")
+    return failures
+
+def check_ingest():
+    import app_fixed
+    from admission import AdmissionController
+
+    unlimited = float("inf")
+    app_fixed.admission = AdmissionController(unlimited, unlimited, unlimited, unlimited)
+    client = app_fixed.app.test_client()
+    before = len(app_fixed.sensor_data_log)
+    failures = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        bodies = [{"device_id": "verify-dedup", "soil_moisture": 40, "seq": 1, "boot": 7}] * 3 + [
+            {"device_id": "verify-dedup", "soil_moisture": 40, "seq": [1]},
+            {"device_id": "verify-dedup", "soil_moisture": 40, "seq": {"n": 1}, "boot": [2]},
+        ]
+        responses = [client.post("/data", json=body) for body in bodies]
+    for body, response in zip(bodies, responses):
+        if response.status_code != 200 or response.get_json().get("status") == "error":
+            failures.append(f"/data {body} gave {response.status_code} {response.get_json()}")
+    stored = len(app_fixed.sensor_data_log) - before
+    if stored != 3:
+        failures.append(f"{stored} readings stored, expected 3 (one retried, two unkeyed)")
+    return failures
+
+def main():
+    failures = []
+    for name, check in (("keys", check_keys), ("seen-set", check_seen_set), ("/data", check_ingest)):
+        found = check()
+        print(f"{'✅' if not found else '❌'} {name}: {'; '.join(found) or 'ok'}")
+        failures.extend(found)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
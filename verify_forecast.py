@@ -0,0 +1,96 @@
+"""
+Check the moisture forecaster at the firmware's real reporting cadence.
+
+Drives MoistureForecaster with one reading every 10 s (the sketch's
+delay(10000)) and whole-percent moisture (Arduino map() returns an integer),
+under a daily temperature swing with sensor noise, for devices drying at
+different known rates that grow with temperature:
+
+- every device must get a negative fitted rate close to its true one
+- schedule() must list each one with a due time in the future
+- a watering jump half way through must not turn the rate positive
+- a device that keeps posting the same moisture is never scheduled
+
+    python verify_forecast.py [--hours 24] [--devices 5]
+
+Needs NumPy.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from irrigation_forecast import MoistureForecaster
+
+CADENCE = 10.0
+START = 1_700_000_000.0
+
+def temperature_at(elapsed):
+    """Daily swing between 20 and 30 degrees"""
+    return 25.0 + 5.0 * np.sin(2 * np.pi * elapsed / 24.0)
+
+def true_rate(base, temperature):
+    """% per hour: base at 25 degrees, 4% faster per degree above"""
+    return base * (1.0 + 0.04 * (temperature - 25.0))
+
+def drive(forecaster, hours, devices, rng):
+    """Feed 10 s readings of devices {id: (base rate, watered)} starting at 90%"""
+    moisture = {device_id: 90.0 for device_id in devices}
+    steps = int(hours * 3600 / CADENCE)
+    for step in range(steps):
+        ts = START + step * CADENCE
+        elapsed = step * CADENCE / 3600.0
+        temperature = temperature_at(elapsed)
+        for device_id, (base, watered) in devices.items():
+            moisture[device_id] += true_rate(base, temperature) * CADENCE / 3600.0
+            if watered and step == steps // 2:
+                moisture[device_id] += 20.0
+            forecaster.update(device_id, ts, float(round(moisture[device_id])),
+                              temperature + rng.normal(0, 0.3), 55.0)
+    return START + steps * CADENCE
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the forecaster at a 10 s reporting cadence")
+    parser.add_argument("--hours", type=float, default=24.0, help="hours of readings to feed")
+    parser.add_argument("--devices", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    devices = {f"dev{i}": (base, False) for i, base in enumerate(np.linspace(-0.5, -1.5, args.devices))}
+    devices["watered"] = (-1.0, True)
+    devices["steady"] = (0.0, False)
+    forecaster = MoistureForecaster()
+    now = drive(forecaster, args.hours, devices, rng)
+    names, _, fitted, _ = forecaster.forecast()
+    fitted = dict(zip(names, fitted.tolist()))
+    schedule = {entry["device_id"]: entry for entry in forecaster.schedule(now=now, horizon_hours=24 * 30)}
+    # The forecast is for the last reading's conditions
+    temperature = temperature_at(args.hours)
+
+    failures = []
+    for device_id, (base, _) in devices.items():
+        if device_id == "steady":
+            continue
+        rate = true_rate(base, temperature)
+        got = fitted[device_id]
+        print(f"   {device_id}: true {rate:+.2f} %/h, fitted {got:+.2f} %/h")
+        if not got < 0:
+            failures.append(f"{device_id} fitted rate {got:+.3f} is not negative")
+        elif abs(got - rate) > 0.25 * abs(rate):
+            failures.append(f"{device_id} fitted rate {got:+.3f} is far from {rate:+.3f}")
+        entry = schedule.get(device_id)
+        if entry is None:
+            failures.append(f"{device_id} is not scheduled")
+        elif not entry["due"] > now:
+            failures.append(f"{device_id} is due at {entry['due']}, not after {now}")
+    if "steady" in schedule:
+        failures.append("a device with steady moisture was scheduled")
+
+    for failure in failures:
+        print(f"   {failure}")
+    print(f"{'✅' if not failures else '❌'} {len(devices)} devices at a {CADENCE:.0f} s cadence: "
+          f"{len(failures) or 'no'} failures")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
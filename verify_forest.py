@@ -0,0 +1,74 @@
+"""
+Check that the compiled forest reproduces sklearn exactly.
+
+Trains the notebook's RandomForest (as train_model.py does), exports it to a
+temporary directory and compares CompiledForest against sklearn on the test
+split plus random rows spanning the feature ranges:
+
+- predict_proba must be bit-identical (not just close)
+- predict and predict_one must give the same class as sklearn's predict
+
+    python verify_forest.py [--rows 20000] [--single-rows 2000]
+
+Needs pandas and scikit-learn.
+"""
+import argparse
+import sys
+import tempfile
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from forest_compiler import CompiledForest, export_forest
+from train_model import load_dataset
+
+def random_rows(X, n, seed=0):
+    """Rows drawn uniformly within each feature's range (categorical soil codes stay integral)"""
+    rng = np.random.default_rng(seed)
+    low, high = X.min(axis=0), X.max(axis=0)
+    rows = rng.uniform(low, high, size=(n, X.shape[1]))
+    rows[:, -1] = np.round(rows[:, -1])
+    return rows
+
+def check_forest(model, forest, X, single_rows=2000):
+    """List of mismatch descriptions between sklearn and the compiled forest (empty if none)"""
+    failures = []
+    expected = model.predict_proba(X)
+    got = forest.predict_proba(X)
+    if not np.array_equal(got, expected):
+        rows = np.flatnonzero((got != expected).any(axis=1))
+        failures.append(f"predict_proba differs on {len(rows)} rows (first: {rows[0]})")
+    if not np.array_equal(forest.predict(X), model.predict(X)):
+        failures.append("predict differs")
+    expected_class = model.predict(X[:single_rows])
+    single = [forest.predict_one(row) for row in X[:single_rows]]
+    if not np.array_equal(np.array(single), expected_class):
+        failures.append("predict_one differs")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled forest with sklearn")
+    parser.add_argument("--data", default="data_core.csv")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=20000, help="random rows to compare")
+    parser.add_argument("--single-rows", type=int, default=2000, help="rows to compare via predict_one")
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestClassifier(n_estimators=args.trees, random_state=42)
+    model.fit(X_train, y_train)
+
+    with tempfile.TemporaryDirectory() as out:
+        export_forest(model, out)
+        forest = CompiledForest.load(out, mmap_mode=None)
+        failures = []
+        for name, rows in (("test split", X_test), ("random rows", random_rows(X, args.rows))):
+            found = check_forest(model, forest, rows, args.single_rows)
+            print(f"{'✅' if not found else '❌'} {name} ({len(rows)} rows): {'; '.join(found) or 'identical'}")
+            failures.extend(found)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())